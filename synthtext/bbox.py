@@ -0,0 +1,217 @@
+"""
+Vectorized bounding-box geometry.
+
+Boxes are stored as 2x4xn arrays (x/y, 4 corners, n boxes); the corners
+go [top-left, top-right, bottom-right, bottom-left] in the frame in
+which the text was rendered.
+"""
+import itertools
+
+import numpy as np
+import cv2
+
+# all the orderings of the 4 corners of a box:
+PERM4 = np.array(list(itertools.permutations(np.arange(4))))
+
+
+def xywh2coords(bbs):
+    """
+    Takes an nx4 bounding-box matrix specified in x,y,w,h
+    format and outputs a 2x4xn bb-matrix, (4 vertices per bb).
+    """
+    bbs = np.asarray(bbs, 'float64')
+    x, y, w, h = bbs[:, 0], bbs[:, 1], bbs[:, 2], bbs[:, 3]
+    return np.stack([
+        np.stack([x, x + w, x + w, x]),
+        np.stack([y, y, y + h, y + h]),
+    ])
+
+
+def homography_transform(bbs, H, offset=None):
+    """
+    Apply homography transform to bounding-boxes.
+    BBS: 2 x 4 x n matrix  (2 coordinates, 4 points, n bbs).
+    Returns the transformed 2x4xn bb-array.
+
+    offset : a 2-tuple (dx,dy), added to points before transfomation.
+    """
+    eps = 1e-16
+    # check the shape of the BB array:
+    t, f, n = bbs.shape
+    assert (t == 2) and (f == 4)
+
+    # append 1 for homogenous coordinates:
+    bbs_h = np.reshape(np.r_[bbs, np.ones((1, 4, n))], (3, 4 * n), order='F')
+    if offset is not None:
+        bbs_h[:2, :] += np.array(offset)[:, None]
+
+    # perpective:
+    bbs_h = H.dot(bbs_h)
+    bbs_h /= (bbs_h[2, :] + eps)
+
+    bbs_h = np.reshape(bbs_h, (3, 4, n), order='F')
+    return bbs_h[:2, :, :]
+
+
+def align_corners(boxes, ref):
+    """
+    BOXES : mx4x2 corners of m boxes, in any order
+    REF   : mx4x2 reference corners
+
+    Returns BOXES with the corners of every box permuted to be
+    closest (in the sum of the corner distances) to REF.
+    """
+    # m x 24 x 4 x 2:
+    cand = boxes[:, PERM4, :]
+    dists = np.linalg.norm(cand - ref[:, None, :, :], axis=3).sum(axis=2)
+    best = PERM4[np.argmin(dists, axis=1)]
+    return np.take_along_axis(boxes, best[:, :, None], axis=1)
+
+
+def char2wordBB(charBB, text):
+    """
+    Converts character bounding-boxes to word-level
+    bounding-boxes.
+
+    charBB : 2x4xn matrix of BB coordinates
+    text   : the text string
+
+    output : 2x4xm matrix of BB coordinates,
+             where, m == number of words.
+    """
+    wrds = text.split()
+    bb_idx = np.r_[0, np.cumsum([len(w) for w in wrds])]
+    nwrd = len(wrds)
+    # n x 4 x 2: the corners of every char:
+    corners = charBB.transpose(2, 1, 0).astype('float32')
+
+    # fit a rotated-rectangle to the corners of the chars of every word
+    # (OpenCV has no batched version):
+    boxes = np.zeros((nwrd, 4, 2), 'float32')
+    for i in range(nwrd):
+        cc = corners[bb_idx[i]:bb_idx[i + 1]].reshape(-1, 2)
+        boxes[i] = cv2.boxPoints(cv2.minAreaRect(cc))
+
+    # align the box corners with those of the first and last chars:
+    # [top-left of the first, top-right, bottom-right of the last,
+    # bottom-left of the first]
+    first, last = corners[bb_idx[:-1]], corners[bb_idx[1:] - 1]
+    ref = np.stack([first[:, 0], last[:, 1], last[:, 2], first[:, 3]], axis=1)
+    boxes = align_corners(boxes, ref)
+    return np.ascontiguousarray(boxes.transpose(2, 1, 0))
+
+
+def get_bounding_rect(min_area_rect):
+    """Get bounding rect of a rotated rect.
+
+        Args:
+            min_area_rect, np.ndarray, 2x4xN, N is the total of rect
+        Return:
+            four_points, np.ndarray, 2x4xN, [top_left, top_right, bottom_right, bottom_left]
+            extreme_points, [xmin, ymin, xmax, ymax]
+    """
+    xmin = min_area_rect[0].min(axis=0)
+    xmax = min_area_rect[0].max(axis=0)
+    ymin = min_area_rect[1].min(axis=0)
+    ymax = min_area_rect[1].max(axis=0)
+
+    xx = np.stack([xmin, xmax, xmax, xmin])
+    yy = np.stack([ymin, ymin, ymax, ymax])
+    four_points = np.stack([xx, yy])
+    extreme_points = [xmin, ymin, xmax, ymax]
+    return four_points, extreme_points
+
+
+def crop_rects(shape, rects):
+    """
+    Integer crop windows of RECTS = [xmins, ymins, xmaxs, ymaxs]
+    (inclusive corners), and whether each lies inside an image of SHAPE.
+
+    Returns (x_start, y_start, x_end, y_end), valid.
+    """
+    rows, cols = shape[:2]
+    xmins, ymins, xmaxs, ymaxs = [np.asarray(r) for r in rects]
+    assert len(xmins) == len(ymins) == len(xmaxs) == len(ymaxs)
+    # truncation towards zero, as int():
+    x_start, y_start = np.trunc(xmins), np.trunc(ymins)
+    x_end, y_end = np.trunc(xmaxs + 1), np.trunc(ymaxs + 1)
+    valid = ((x_start >= 0) & (y_start >= 0) & (x_end <= cols)
+             & (y_end <= rows))
+    windows = [w.astype('int64') for w in (x_start, y_start, x_end, y_end)]
+    return windows, valid
+
+
+def get_crops(img, rects):
+    """Get crops from image based on rects.
+
+    Args:
+        img, np.ndarray
+        rects, [xmins, ymins, xmaxs, ymaxs], each entry has a length of N (total of rect), (xmin, ymin) is the top left point of a rect, (xmax, ymax) is the bottom right point of a rect
+            xmins, np.ndarray
+    Return:
+        crops, list of crop (a view of IMG, or None if the rect is not
+        inside the image), and the list of valid flags
+    """
+    (xs, ys, xe, ye), valid = crop_rects(img.shape, rects)
+    crops = [
+        img[ys[i]:ye[i], xs[i]:xe[i]] if valid[i] else None
+        for i in range(len(valid))
+    ]
+    return crops, valid.tolist()
+
+
+def filter_valid(raw_list, valid_flags):
+    return [x for x, is_valid in zip(raw_list, valid_flags) if is_valid]
+
+
+def homography_roi(xywh, H, shape, pad=0):
+    """
+    Integer window (x0, y0, x1, y1) (x1, y1 exclusive) of an image of
+    SHAPE which holds the box XYWH once transformed by the homography H,
+    grown by PAD pixels on every side.
+    Returns None if the window is outside the image.
+    """
+    rows, cols = shape[:2]
+    bb = homography_transform(xywh2coords(np.atleast_2d(xywh)), H)
+    if not np.all(np.isfinite(bb)):
+        # degenerate projection: use the whole image
+        return 0, 0, cols, rows
+    size = np.array([cols, rows])
+    x0, y0 = np.clip(np.floor(bb.min(axis=(1, 2))) - pad, 0, size).astype(int)
+    x1, y1 = np.clip(np.ceil(bb.max(axis=(1, 2))) + pad + 1, 0,
+                     size).astype(int)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+
+class BoxBuffer(object):
+    """
+    Growable 2x4xn array of boxes: APPEND adds boxes in amortized
+    constant time per box (the storage doubles when full).
+    """
+    def __init__(self, capacity=64, dtype='float64'):
+        self.data = np.zeros((2, 4, capacity), dtype)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def append(self, bbs):
+        """
+        BBS : 2x4xm boxes to add.
+        """
+        m = bbs.shape[2]
+        if self.n + m > self.data.shape[2]:
+            size = max(2 * self.data.shape[2], self.n + m)
+            data = np.zeros((2, 4, size), self.data.dtype)
+            data[:, :, :self.n] = self.data[:, :, :self.n]
+            self.data = data
+        self.data[:, :, self.n:self.n + m] = bbs
+        self.n += m
+
+    def array(self):
+        """
+        A (contiguous) copy of the boxes added so far.
+        """
+        return self.data[:, :, :self.n].copy()
@@ -10,20 +10,31 @@ from PIL import Image
 
 import cv2
 
+from synthtext.common import NO_DEADLINE
 from synthtext.synth.poisson_reconstruct import blit_images
 from synthtext.config import load_cfg
+from synthtext.timing import span
 
 from .font_color import FontColor
 from .layer import Layer
 
 
 class Colorizer(object):
-    def __init__(self):
+    def __init__(self, rng=None):
         # # get a list of background-images:
         # imlist = [osp.join(im_path,f) for f in os.listdir(im_path)]
         # self.bg_list = [p for p in imlist if osp.isfile(p)]
         load_cfg(self)
         self.font_color = FontColor(self.font_fp)
+        self.set_rng(rng)
+
+    def set_rng(self, rng=None):
+        """
+        RNG : numpy.random.Generator to draw from (None: a fresh one),
+              shared with the font colors.
+        """
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.font_color.set_rng(self.rng)
 
     def drop_shadow(self, alpha, theta, shift, size, op=0.80):
         """
@@ -128,7 +139,7 @@ class Colorizer(object):
             - could be the same as bg-color but lower/higher 'VALUE'.
             - could be 'mid-way' color b/w text & bg colors.
         """
-        choice = np.random.choice(3)
+        choice = self.rng.choice(3)
 
         col_text = cv2.cvtColor(col_text, cv2.COLOR_RGB2HSV)
         col_text = np.reshape(col_text, (np.prod(col_text.shape[:2]), 3))
@@ -139,8 +150,8 @@ class Colorizer(object):
         def get_sample(x):
             ps = np.abs(vs - x / 255.0)
             ps /= np.sum(ps)
-            rand_num1 = np.random.choice(vs, p=ps)
-            rand_num2 = np.random.randn()
+            rand_num1 = self.rng.choice(vs, p=ps)
+            rand_num2 = self.rng.standard_normal()
             v_rand = np.clip(rand_num1 + 0.1 * rand_num2, 0, 1)
             return 255 * v_rand
 
@@ -188,11 +199,12 @@ class Colorizer(object):
         fg_col, bg_col = self.font_color.sample_color(bg_arr)
         return Layer(alpha=text_arr, color=fg_col), fg_col, bg_col
 
-    def paste(self, text_arr, bg_arr, min_h):
+    def paste(self, text_arr, bg_arr, min_h, deadline=NO_DEADLINE):
         """
         text_arr : one alpha mask : nxm, uint8
         bg_arr   : background image: nxmx3, uint8
         min_h    : height of the smallest character (px)
+        deadline : time budget of the poisson image editing
 
         return text_arr blit onto bg_arr.
         """
@@ -201,13 +213,13 @@ class Colorizer(object):
         bg_col = np.mean(np.mean(bg_arr, axis=0), axis=0)
         l_bg = Layer(alpha=255 * np.ones_like(text_arr, 'uint8'), color=bg_col)
 
-        rand_num = np.random.randn()
+        rand_num = self.rng.standard_normal()
         l_text.alpha = l_text.alpha * np.clip(0.88 + 0.1 * rand_num, 0.72, 1.0)
         layers = [l_text]
         blends = []
 
         # add border:
-        if np.random.rand() < self.p_border:
+        if self.rng.random() < self.p_border:
             if min_h <= 15: bsz = 1
             elif 15 < min_h < 30: bsz = 3
             else: bsz = 5
@@ -218,7 +230,7 @@ class Colorizer(object):
             blends.append('normal')
 
         # add shadow:
-        if np.random.rand() < self.p_drop_shadow:
+        if self.rng.random() < self.p_drop_shadow:
             # shadow gaussian size:
             if min_h <= 15:
                 bsz = 1
@@ -228,19 +240,19 @@ class Colorizer(object):
                 bsz = 5
 
             # shadow angle:
-            theta = np.pi / 4 * np.random.choice([1, 3, 5, 7
-                                                  ]) + 0.5 * np.random.randn()
+            theta = np.pi / 4 * self.rng.choice([1, 3, 5, 7
+                                                  ]) + 0.5 * self.rng.standard_normal()
 
             # shadow shift:
             if min_h <= 15:
                 shift = 2
             elif 15 < min_h < 30:
-                shift = 7 + np.random.randn()
+                shift = 7 + self.rng.standard_normal()
             else:
-                shift = 15 + 3 * np.random.randn()
+                shift = 15 + 3 * self.rng.standard_normal()
 
             # opacity:
-            op = 0.50 + 0.1 * np.random.randn()
+            op = 0.50 + 0.1 * self.rng.standard_normal()
 
             shadow = self.drop_shadow(l_text.alpha, theta, shift, 3 * bsz, op)
             l_shadow = Layer(shadow, 0)
@@ -253,7 +265,10 @@ class Colorizer(object):
         l_normal = self.merge_down(layers, blends)
         # now do poisson image editing:
         l_bg = Layer(alpha=255 * np.ones_like(text_arr, 'uint8'), color=bg_arr)
-        l_out = blit_images(l_normal.color, l_bg.color.copy())
+        with span('poisson'):
+            l_out = blit_images(l_normal.color,
+                                l_bg.color.copy(),
+                                deadline=deadline)
 
         # plt.subplot(1,3,1)
         # plt.imshow(l_normal.color)
@@ -273,14 +288,22 @@ class Colorizer(object):
         return l_out
 
     # main method
-    def colorize(self, bg_arr, text_arr, hs, place_order=None, pad=20):
+    def colorize(self,
+                 bg_arr,
+                 text_arr,
+                 hs,
+                 text_loc=None,
+                 place_order=None,
+                 pad=20,
+                 deadline=NO_DEADLINE):
         """
         Return colorized text image.
 
         text_arr : list of (n x m) numpy text alpha mask (unit8).
         hs : list of minimum heights (scalar) of characters in each text-array. 
-        text_loc : [row,column] : location of text in the canvas.
-        canvas_sz : size of canvas image.
+        text_loc : list of [row,column] : location of the top-left corner
+                   of each text-array in the canvas (None: all at [0,0],
+                   i.e. the text-arrays span the canvas).
         
         return : nxmx3 rgb colorized text-image.
         """
@@ -294,6 +317,8 @@ class Colorizer(object):
         # initialize the placement order:
         if place_order is None:
             place_order = np.array(range(len(text_arr)))
+        if text_loc is None:
+            text_loc = np.zeros((len(text_arr), 2), 'int')
 
         rendered = []
         for i in place_order[::-1]:
@@ -305,6 +330,7 @@ class Colorizer(object):
             l = np.array([lx, ly])
             m = np.array([mx, my]) - l + 1
             text_patch = text_arr[i][l[0]:l[0] + m[0], l[1]:l[1] + m[1]]
+            l += np.array(text_loc[i], dtype=l.dtype)
 
             # figure out padding:
             ext = canvas_sz - (l + m)
@@ -320,7 +346,7 @@ class Colorizer(object):
             w, h = text_patch.shape
             bg = bg_arr[l[0]:l[0] + w, l[1]:l[1] + h, :]
 
-            rdr0 = self.paste(text_patch, bg, hs[i])
+            rdr0 = self.paste(text_patch, bg, hs[i], deadline)
             rendered.append(rdr0)
 
             bg_arr[l[0]:l[0] + w, l[1]:l[1] + h, :] = rdr0  #rendered[-1]
@@ -9,7 +9,8 @@ from synthtext.config import load_cfg
 class FontColor(object):
     """
     """
-    def __init__(self, col_file):
+    def __init__(self, col_file, rng=None):
+        self.set_rng(rng)
         with open(col_file, 'rb') as f:
             self.rgb_colors = pickle.load(f)
         self.ncol = self.rgb_colors.shape[0]
@@ -21,12 +22,18 @@ class FontColor(object):
         self.lab_colors = np.squeeze(
             cv2.cvtColor(self.lab_colors[None, :, :], cv2.COLOR_RGB2Lab))
 
+    def set_rng(self, rng=None):
+        """
+        RNG : numpy.random.Generator to draw from (None: a fresh one).
+        """
+        self.rng = np.random.default_rng() if rng is None else rng
+
     def sample_normal(self, col_mean, col_std):
         """
         sample from a normal distribution centered around COL_MEAN 
         with standard deviation = COL_STD.
         """
-        rand_num = np.random.randn()
+        rand_num = self.rng.standard_normal()
         col_sample = col_mean + col_std * rand_num
         return np.clip(col_sample, 0, 255).astype('uint8')
 
@@ -1,8 +1,9 @@
 import sys
-import signal
+import time
 import random
+import hashlib
+import threading
 import numpy as np
-from contextlib import contextmanager
 
 
 def set_random_seed(seed=0):
@@ -10,19 +11,52 @@ def set_random_seed(seed=0):
     random.seed(seed)
 
 
-@contextmanager
-def time_limit(seconds):
-    def signal_handler(signum, frame):
-        pass  #raise TimeoutException
+def derive_rng(*keys):
+    """
+    Returns a numpy.random.Generator whose stream is determined by KEYS
+    alone, e.g. (seed, scene index, 'text', instance index): any sample
+    can be regenerated in isolation, in any process.
+    """
+    digest = hashlib.md5(repr(keys).encode('utf-8')).digest()
+    return np.random.default_rng(int.from_bytes(digest, 'little'))
 
-    signal.signal(signal.SIGALRM, signal_handler)
-    signal.alarm(seconds)
-    try:
-        yield
-    finally:
-        signal.alarm(0)
 
-
-# http://stackoverflow.com/questions/366682/how-to-limit-execution-time-of-a-function-call-in-python
 class TimeoutException(Exception):
     pass
+
+
+class Deadline(object):
+    """
+    Cooperative time budget of SECONDS (None for no limit).
+
+    Long-running loops call check(STAGE) at their boundaries, which
+    raises TimeoutException once the budget is spent; unlike SIGALRM
+    this works in any thread. Every expiry is counted per stage in
+    EXCEEDED (a dict: stage -> count), if given.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, seconds=None, exceeded=None):
+        self.seconds = seconds
+        self.end = None if seconds is None else time.monotonic() + seconds
+        self.exceeded = exceeded
+
+    def remaining(self):
+        if self.end is None:
+            return float('inf')
+        return self.end - time.monotonic()
+
+    def expired(self):
+        return self.end is not None and time.monotonic() > self.end
+
+    def check(self, stage):
+        if self.expired():
+            if self.exceeded is not None:
+                with self._lock:
+                    self.exceeded[stage] = self.exceeded.get(stage, 0) + 1
+            raise TimeoutException('%s: exceeded the time budget of %.1fs' %
+                                   (stage, self.seconds))
+
+
+# default for functions which take a deadline:
+NO_DEADLINE = Deadline()
@@ -27,8 +27,19 @@ TextRegions = dict(
     dist_thresh=0.10,  # m
     num_inlier=90,
     ransac_fit_trials=100,
+    # preemptive RANSAC: score the hypotheses on a subset of the points
+    # first and stop early (see synth.ransac.preemptive_search):
+    ransac_preemptive=False,
+    ransac_subset=256,  # no. of points in the scoring subset
+    ransac_block=10,  # hypotheses drawn between two stopping checks
+    ransac_confidence=0.99,
     min_z_projection=0.25,
     min_rectified_w=20,
+    # coarse-to-fine analysis: filter the regions and fit their planes on
+    # every coarse_scale-th pixel first (1: at full resolution only):
+    coarse_scale=1,
+    # threads for the per-region plane fitting and rectification:
+    region_threads=1,
 )
 
 ## text_renderer
@@ -54,6 +65,8 @@ TextState = dict(
     char_freq_fp=osp.join(data_dir, 'models/char_freq.pkl'),
     font_model_fp=osp.join(data_dir, 'models/font_px2pt.pkl'),
     font_list_fp=osp.join(data_dir, 'fonts/fontlist.txt'),
+    # no. of parsed fonts kept in memory (LRU; 0: parse on every use):
+    font_cache_size=64,
     # normal dist mean, std
     size=[50, 10],
     underline=0.05,
@@ -104,6 +117,15 @@ Corpora = dict(
     center_para=0.5,
 )
 
+## timing
+# per-stage timing (see synthtext/timing.py); also switched on by the
+# environment variables SYNTHTEXT_TIMING=1 / SYNTHTEXT_TRACE_DIR=<dir>
+Timing = dict(
+    enabled=False,
+    # directory for Chrome-trace files (one per process), or None:
+    trace_dir=None,
+)
+
 ## colorizer
 # probabilities of different text-effects:
 Colorizer = dict(
@@ -0,0 +1,9 @@
+from .assets import has_assets, set_data_dir, write_synthetic_assets
+from .driver import GenerationDriver
+from .encoders import (PNGEncoder, JPEGEncoder, RawEncoder, EncoderPool,
+                       get_encoder, decode)
+from .loader import SceneLoader
+from .manifest import Manifest
+from .scenes import (H5SceneSource, MemmapSceneSource, SyntheticSceneSource,
+                     write_scene_store)
+from .sinks import DirSink, TarShardSink, H5ShardSink, read_h5_shard
@@ -0,0 +1,85 @@
+import os
+import os.path as osp
+import pickle
+import string
+
+import numpy as np
+from pygame import freetype
+
+from synthtext.config import CFG
+
+# text assets read by the Renderer: (config section, key, path in data/)
+ASSETS = [
+    ('TextState', 'char_freq_fp', 'models/char_freq.pkl'),
+    ('TextState', 'font_model_fp', 'models/font_px2pt.pkl'),
+    ('TextState', 'font_list_fp', 'fonts/fontlist.txt'),
+    ('Corpora', 'corpora_fp', 'newsgroup/alpha_words.txt'),
+    ('Colorizer', 'font_fp', 'models/colors_new.pkl'),
+]
+
+
+def has_assets(data_dir):
+    """
+    Whether DATA_DIR holds all the text assets (fonts, corpus, models).
+    """
+    return all(osp.exists(osp.join(data_dir, fp)) for _, _, fp in ASSETS)
+
+
+def set_data_dir(data_dir):
+    """
+    Points CFG at the text assets under DATA_DIR. Only the objects
+    created afterwards (e.g. a new Renderer) read them from there.
+    """
+    CFG.TextState['data_dir'] = data_dir
+    for section, key, fp in ASSETS:
+        getattr(CFG, section)[key] = osp.join(data_dir, fp)
+
+
+def write_synthetic_assets(out_dir, seed=0, nline=2000):
+    """
+    Writes stand-ins for the text assets of data.tar.gz under OUT_DIR (in
+    the same layout), for benchmarks and tests which must run without it:
+    the default font of pygame, a corpus of NLINE lines of random words,
+    uniform character frequencies, random font / background color pairs,
+    and the pixel-to-point model of the font, fit as in invert_font_size.
+    """
+    freetype.init()
+    rs = np.random.RandomState(seed)
+    for d in ['models', 'fonts', 'newsgroup']:
+        if not osp.exists(osp.join(out_dir, d)):
+            os.makedirs(osp.join(out_dir, d))
+
+    # fonts are listed relative to the data dir; an absolute path is kept
+    font_fp = osp.join(osp.dirname(freetype.__file__),
+                       freetype.get_default_font())
+    with open(osp.join(out_dir, 'fonts/fontlist.txt'), 'w') as f:
+        f.write(font_fp + '\n')
+
+    # linear model of the glyph height (px) from the font size (pt):
+    font = freetype.Font(font_fp)
+    ys = np.arange(8, 200)
+    h = np.array([font.get_sized_glyph_height(int(y)) for y in ys])
+    m = np.linalg.lstsq(np.c_[ys, np.ones_like(ys)], h, rcond=None)[0]
+    with open(osp.join(out_dir, 'models/font_px2pt.pkl'), 'wb') as f:
+        pickle.dump({font.name: m}, f)
+
+    chars = string.ascii_letters + string.digits
+    with open(osp.join(out_dir, 'models/char_freq.pkl'), 'wb') as f:
+        pickle.dump({c: 1.0 for c in chars}, f)
+
+    # rows: text color mean, std, background color mean, std (RGB):
+    colors = np.c_[rs.randint(0, 256, (50, 3)),
+                   rs.randint(0, 30, (50, 3)),
+                   rs.randint(0, 256, (50, 3)),
+                   rs.randint(0, 30, (50, 3))].astype('float64')
+    with open(osp.join(out_dir, 'models/colors_new.pkl'), 'wb') as f:
+        pickle.dump(colors, f)
+
+    letters = np.array(list(string.ascii_lowercase))
+    with open(osp.join(out_dir, 'newsgroup/alpha_words.txt'), 'w') as f:
+        for _ in range(nline):
+            words = [
+                ''.join(rs.choice(letters, rs.randint(2, 11)))
+                for _ in range(rs.randint(1, 9))
+            ]
+            f.write(' '.join(words) + '\n')
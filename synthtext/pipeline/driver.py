@@ -0,0 +1,213 @@
+import multiprocessing as mp
+import signal
+import traceback
+
+import cv2
+
+from synthtext.common import derive_rng
+from synthtext.renderer import Renderer
+from synthtext.renderer.text_regions import TEXT_REGIONS
+from synthtext.synth.ransac import report_counts
+from synthtext.timing import TIMER, merge_stats, report
+
+from .loader import SceneLoader
+
+# per-process state, set up by _init_worker:
+_worker = {}
+
+
+def _init_worker(source, process_fn, ninstance, seed, cache):
+    # one process per core: keep OpenCV from spawning its own threads
+    cv2.setNumThreads(1)
+    _worker['renderer'] = Renderer()
+    # pygame.init() (SDL) hooks SIGINT/SIGTERM; restore the defaults
+    # so that the pool can still terminate its workers:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _worker['source'] = source
+    _worker['process_fn'] = process_fn
+    _worker['ninstance'] = ninstance
+    _worker['seed'] = seed
+    _worker['cache'] = cache
+
+
+def _render_scene(idx, imname, scene):
+    """
+    Renders one scene in the current worker.
+    INDEX is the position of the scene in the full list of scenes and
+    is used, with the root seed, to derive the random streams of the
+    instances, so that the output does not depend on the worker / order.
+    The stream of the region analysis is derived from the scene name
+    instead, so that cached regions stay valid for any list of scenes.
+    SCENE : (rgb, depth, seg, area, label), or None if it failed to load.
+
+    The region analysis and every instance have streams of their own,
+    so that the output is the same whether the regions come from the
+    cache or not, and any instance can be regenerated on its own.
+
+    The instances are reduced by PROCESS_FN one at a time, as they are
+    rendered, so that only their reduced form (e.g. word crops) is held
+    until the whole scene is done.
+
+    Returns (index, imname, [process_fn(imname, idict), ...], stats), where
+    STATS holds the no. of placements which ran out of time, the time
+    spent, per stage, and the RANSAC counts. The output is None if the
+    scene failed to load or to render.
+    """
+    renderer, cache = _worker['renderer'], _worker['cache']
+    renderer.budget_exceeded.clear()
+    TEXT_REGIONS.ransac_counts.clear()
+    TIMER.reset()
+    out = None
+    if scene is not None:
+        try:
+            regions = None if cache is None else cache.get(imname)
+            if regions is None:
+                rng = derive_rng(_worker['seed'], imname, 'regions')
+                regions = renderer.get_regions(*scene[1:], rng=rng)
+                if cache is not None:
+                    cache.put(imname, regions)
+            out = []
+            for idict in renderer.iter_render(*scene,
+                                              ninstance=_worker['ninstance'],
+                                              regions=regions,
+                                              seed=(_worker['seed'], idx,
+                                                    'text')):
+                out.append(_worker['process_fn'](imname, idict))
+        except Exception:
+            # a single bad scene should not bring the whole run down:
+            traceback.print_exc()
+            out = None
+    TIMER.flush_trace()
+    stats = {
+        'budget_exceeded': dict(renderer.budget_exceeded),
+        'timing': TIMER.stats(),
+        'ransac': dict(TEXT_REGIONS.ransac_counts),
+    }
+    return idx, imname, out, stats
+
+
+def _run_scene(job):
+    """
+    Loads and renders the scene JOB = (index, imname).
+    """
+    idx, imname = job
+    try:
+        scene = _worker['source'].load(imname)
+    except Exception:
+        traceback.print_exc()
+        scene = None
+    return _render_scene(idx, imname, scene)
+
+
+class GenerationDriver(object):
+    """
+    Shards scenes across NWORKER processes, each holding its own Renderer
+    (fonts, corpora, color model).
+
+    SOURCE     : scene source with a load(imname) method,
+                 e.g. H5SceneSource.
+    PROCESS_FN : f(imname, idict) run in the worker on every rendered
+                 instance (see Renderer.iter_render), as soon as it is
+                 rendered; the list of its return values is shipped to
+                 the sink. Use it to reduce IDICT (e.g. to word crops),
+                 so that the full image can be freed.
+    PREFETCH   : no. of scenes loaded ahead in the background, when
+                 rendering in a single process.
+    CACHE      : RegionCache of the region analysis of the scenes;
+                 scenes cached without any text region are skipped
+                 without being loaded.
+    """
+    def __init__(self,
+                 source,
+                 process_fn,
+                 nworker=1,
+                 ninstance=1,
+                 seed=0,
+                 prefetch=2,
+                 cache=None):
+        self.source = source
+        self.process_fn = process_fn
+        self.nworker = nworker
+        self.ninstance = ninstance
+        self.seed = seed
+        self.prefetch = prefetch
+        self.cache = cache
+        # no. of placements which exceeded their time budget, per stage:
+        self.budget_exceeded = {}
+        # time spent per stage, if timing is enabled (see synthtext.timing):
+        self.timing = {}
+        # RANSAC hypotheses drawn / saved (see synth.ransac):
+        self.ransac = {}
+        # scenes which failed to load or to render (not passed to the sink):
+        self.failed = []
+
+    def add_stats(self, stats):
+        for stage, n in stats['budget_exceeded'].items():
+            self.budget_exceeded[stage] = self.budget_exceeded.get(stage, 0) + n
+        merge_stats(self.timing, stats['timing'])
+        for k, n in stats['ransac'].items():
+            self.ransac[k] = self.ransac.get(k, 0) + n
+
+    def iter_results(self, imnames, skip=()):
+        """
+        Yields (index, imname, [process_fn(imname, idict), ...]) for every
+        scene in IMNAMES which is not in SKIP, in order of completion; the
+        output is None for the scenes which failed.
+        """
+        jobs = [(i, n) for i, n in enumerate(imnames) if n not in skip]
+        if self.cache is not None:
+            # scenes known to have no text regions:
+            empty = [(i, n) for i, n in jobs if self.cache.nregions(n) == 0]
+            for idx, imname in empty:
+                yield idx, imname, []
+            empty = set(empty)
+            jobs = [job for job in jobs if job not in empty]
+        initargs = (self.source, self.process_fn, self.ninstance, self.seed,
+                    self.cache)
+        if self.nworker <= 1:
+            _init_worker(*initargs)
+            for idx, imname, scene in SceneLoader(self.source, jobs,
+                                                  self.prefetch):
+                idx, imname, out, stats = _render_scene(idx, imname, scene)
+                self.add_stats(stats)
+                yield idx, imname, out
+        else:
+            pool = mp.Pool(self.nworker,
+                           initializer=_init_worker,
+                           initargs=initargs)
+            try:
+                for idx, imname, out, stats in pool.imap_unordered(
+                        _run_scene, jobs):
+                    self.add_stats(stats)
+                    yield idx, imname, out
+            finally:
+                pool.terminate()
+                pool.join()
+
+    def run(self, imnames, sink, skip=()):
+        """
+        Renders IMNAMES (except those in SKIP) and calls
+        SINK(index, imname, out) in the parent process for every
+        finished scene. The scenes which failed are not passed to SINK
+        (so that they are not recorded as done), but listed in FAILED.
+        """
+        skip = set(skip)
+        nimg = len([n for n in imnames if n not in skip])
+        results = self.iter_results(imnames, skip)
+        for i, (idx, imname, out) in enumerate(results):
+            print('Image %d/%d : %s' % (i, nimg - 1, imname))
+            if out is None:
+                self.failed.append(imname)
+                continue
+            sink(idx, imname, out)
+        if len(self.failed) > 0:
+            print('Scenes failed (not recorded as done): %d' %
+                  len(self.failed))
+        if len(self.budget_exceeded) > 0:
+            print('Placements over the time budget: ' + ', '.join(
+                '%s: %d' % kv for kv in sorted(self.budget_exceeded.items())))
+        if self.ransac.get('fits', 0) > 0:
+            print(report_counts(self.ransac))
+        if len(self.timing) > 0:
+            print(report(self.timing))
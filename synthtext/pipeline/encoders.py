@@ -0,0 +1,144 @@
+import io
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+class PNGEncoder(object):
+    ext = 'png'
+
+    def __init__(self, compress_level=6):
+        # zlib level: 0 (none, fastest) .. 9 (smallest); PIL default is 6
+        self.compress_level = compress_level
+
+    def encode(self, img):
+        buf = io.BytesIO()
+        Image.fromarray(img).save(buf,
+                                  format='PNG',
+                                  compress_level=self.compress_level)
+        return buf.getvalue()
+
+
+class JPEGEncoder(object):
+    ext = 'jpg'
+
+    def __init__(self, quality=90):
+        self.quality = quality
+
+    def encode(self, img):
+        buf = io.BytesIO()
+        Image.fromarray(img).save(buf, format='JPEG', quality=self.quality)
+        return buf.getvalue()
+
+
+class RawEncoder(object):
+    """
+    Raw uint8 arrays, serialized as .npy (keeps the shape).
+    """
+    ext = 'npy'
+
+    def encode(self, img):
+        buf = io.BytesIO()
+        np.save(buf, np.ascontiguousarray(img, 'uint8'))
+        return buf.getvalue()
+
+
+def decode(data, ext):
+    buf = io.BytesIO(data)
+    if ext == 'npy':
+        return np.load(buf)
+    return np.array(Image.open(buf))
+
+
+def get_encoder(name, compress_level=6, quality=90):
+    if name == 'png':
+        return PNGEncoder(compress_level)
+    if name == 'jpg':
+        return JPEGEncoder(quality)
+    if name == 'raw':
+        return RawEncoder()
+    raise ValueError('unknown encoder: %s' % name)
+
+
+class EncoderPool(object):
+    """
+    Encodes the 'img' field of batches of samples with ENCODER on a pool
+    of NTHREAD threads (PIL releases the GIL while compressing); with
+    NTHREAD=0 the images are encoded synchronously in submit().
+
+    Batches are handed back by ready() in submission order. Submitting
+    only blocks once MAX_PENDING batches are waiting to be encoded.
+    If ENCODER is None, the images are passed through un-encoded.
+    """
+    def __init__(self, encoder, nthread=4, max_pending=4):
+        self.encoder = encoder
+        self.executor = None
+        if encoder is not None and nthread > 0:
+            self.executor = ThreadPoolExecutor(nthread)
+        self.max_pending = max_pending
+        self.pending = deque()
+
+        self.lock = threading.Lock()
+        self.nimage, self.nbytes, self.encode_time = 0, 0, 0.0
+        self.start_time = time.time()
+
+    def encode(self, img):
+        t0 = time.time()
+        data = self.encoder.encode(img)
+        dt = time.time() - t0
+        with self.lock:
+            self.nimage += 1
+            self.nbytes += len(data)
+            self.encode_time += dt
+        return data
+
+    def submit(self, batch):
+        imgs = [sample.get('img') for _, sample in batch]
+        futures = []
+        for img in imgs:
+            if self.executor is not None and img is not None:
+                futures.append(self.executor.submit(self.encode, img))
+            else:
+                f = Future()
+                if self.encoder is None or img is None:
+                    f.set_result(None)
+                else:
+                    f.set_result(self.encode(img))
+                futures.append(f)
+        self.pending.append((batch, futures))
+
+    def ready(self, wait=False):
+        """
+        Yields (batch, encoded images) for the batches whose encoding has
+        finished, in submission order. Waits for all of them if WAIT,
+        and for the oldest while more than MAX_PENDING are in flight.
+        """
+        while len(self.pending) > 0:
+            batch, futures = self.pending[0]
+            if not (wait or len(self.pending) > self.max_pending
+                    or all(f.done() for f in futures)):
+                break
+            self.pending.popleft()
+            yield batch, [f.result() for f in futures]
+
+    def report(self):
+        """
+        Returns a summary of the encoding throughput.
+        """
+        if self.encoder is None:
+            return 'no encoding'
+        wall = max(time.time() - self.start_time, 1e-6)
+        per_thread = self.nimage / max(self.encode_time, 1e-6)
+        return ('%s: %d images, %.1f MB in %.1fs of encoding '
+                '(%.1f img/s/thread, %.1f img/s, %.2f MB/s overall)' %
+                (self.encoder.ext, self.nimage, self.nbytes / 1e6,
+                 self.encode_time, per_thread, self.nimage / wall,
+                 self.nbytes / 1e6 / wall))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
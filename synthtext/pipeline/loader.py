@@ -0,0 +1,86 @@
+import multiprocessing as mp
+import queue
+import threading
+import traceback
+
+# end of the scene list:
+_DONE = None
+
+
+def _put(q, item, stop):
+    # block on a full queue, but give up once the consumer has stopped:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _load_scene(source, imname):
+    try:
+        return source.load(imname)
+    except Exception:
+        traceback.print_exc()
+        return None
+
+
+def _load_scenes(source, jobs, q, stop):
+    for idx, imname in jobs:
+        if stop.is_set():
+            return
+        _put(q, (idx, imname, _load_scene(source, imname)), stop)
+    _put(q, _DONE, stop)
+
+
+class SceneLoader(object):
+    """
+    Iterates over the scenes JOBS = [(index, imname), ...] of SOURCE,
+    reading and pre-processing (decode, resize) the next DEPTH scenes in
+    the background while the current one is being rendered.
+    The background worker is a thread, or a process if PROCESS is True.
+
+    Yields (index, imname, scene), where SCENE is the
+    (rgb, depth, seg, area, label) tuple to pass to Renderer.render,
+    or None if the scene could not be loaded.
+    """
+    def __init__(self, source, jobs, depth=2, process=False):
+        self.source = source
+        self.jobs = list(jobs)
+        self.depth = depth
+        self.process = process
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __iter__(self):
+        if self.depth <= 0:  # no prefetching
+            for idx, imname in self.jobs:
+                yield idx, imname, _load_scene(self.source, imname)
+            return
+
+        if self.process:
+            q, stop = mp.Queue(self.depth), mp.Event()
+            worker = mp.Process(target=_load_scenes,
+                                args=(self.source, self.jobs, q, stop))
+        else:
+            q, stop = queue.Queue(self.depth), threading.Event()
+            worker = threading.Thread(target=_load_scenes,
+                                      args=(self.source, self.jobs, q, stop))
+        worker.daemon = True
+        worker.start()
+        try:
+            while True:
+                item = q.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            stop.set()
+            # unblock the worker (and the feeder thread of mp.Queue):
+            while worker.is_alive():
+                try:
+                    q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            worker.join()
@@ -0,0 +1,70 @@
+import json
+import os
+import os.path as osp
+
+
+class Manifest(object):
+    """
+    Append-only, fsync'd record of the scenes of a generation run whose
+    output is safely on disk.
+
+    The first line is a header with the run parameters (e.g. the random
+    seed, from which the random state of every scene is derived); every
+    following line records a group of completed scenes:
+        {"shard": SHARD_IDX, "scenes": [[index, imname, ninstance], ...]}
+
+    With RESUME=True an existing manifest is re-opened, after checking
+    that its header matches HEADER; otherwise it is started afresh.
+    """
+    def __init__(self, fp, header, resume=False):
+        self.fp = fp
+        self.header = header
+        self.completed = {}
+        self.last_shard = -1
+
+        if resume and osp.exists(fp):
+            self.load()
+        else:
+            self.fd = open(fp, 'w')
+            self.append(header)
+
+    def load(self):
+        with open(self.fp, 'r') as fd:
+            lines = fd.readlines()
+        header = json.loads(lines[0])
+        if header != self.header:
+            raise ValueError('cannot resume %s: run parameters differ '
+                             '(%s != %s)' % (self.fp, header, self.header))
+        for line in lines[1:]:
+            try:
+                rec = json.loads(line)
+            except ValueError:  # torn last line
+                break
+            for idx, imname, ninstance in rec['scenes']:
+                self.completed[imname] = (idx, ninstance)
+            if rec['shard'] is not None:
+                self.last_shard = max(self.last_shard, rec['shard'])
+        self.fd = open(self.fp, 'a')
+        # drop a torn last line, if any:
+        self.fd.truncate(sum(len(l) for l in lines if l.endswith('\n')))
+
+    def append(self, rec):
+        self.fd.write(json.dumps(rec) + '\n')
+        self.fd.flush()
+        os.fsync(self.fd.fileno())
+
+    def add(self, scenes, shard=None):
+        """
+        SCENES : list of (index, imname, ninstance) of completed scenes.
+        SHARD  : index of the output shard holding them, if any.
+        """
+        if len(scenes) == 0:
+            return
+        self.append({'shard': shard, 'scenes': [list(s) for s in scenes]})
+        for idx, imname, ninstance in scenes:
+            self.completed[imname] = (idx, ninstance)
+        if shard is not None:
+            self.last_shard = max(self.last_shard, shard)
+
+    def close(self):
+        self.fd.close()
@@ -0,0 +1,237 @@
+import os
+import os.path as osp
+
+import cv2
+import h5py
+import numpy as np
+from PIL import Image
+
+
+class H5SceneSource(object):
+    """
+    Reads scenes from the image/depth/segmentation h5 database (dset.h5)
+    and returns them in the form expected by Renderer.render.
+
+    The h5 file is opened lazily, so that every (forked or spawned) worker
+    process ends up with its own file handle.
+    """
+    def __init__(self, db_fp):
+        self.db_fp = db_fp
+        self._db = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_db'], state['_pid'] = None, None
+        return state
+
+    @property
+    def db(self):
+        if self._db is None or self._pid != os.getpid():
+            self._db = h5py.File(self.db_fp, 'r')
+            self._pid = os.getpid()
+        return self._db
+
+    def names(self):
+        """
+        Returns the sorted names of the scenes in the database.
+        """
+        return sorted(self.db['image'].keys())
+
+    def load(self, imname):
+        """
+        Returns (rgb, depth, seg, area, label) of the scene IMNAME,
+        with the image and segmentation re-sized to the depth resolution.
+        """
+        img = Image.fromarray(self.db['image'][imname][:])
+        # there are 2 estimates of depth (represented as 2 "channels")
+        # here we are using the second one (in some cases it might be
+        # useful to use the other one):
+        depth = self.db['depth'][imname][:].T
+        depth = depth[:, :, 1]
+        seg = self.db['seg'][imname][:].astype('float32')
+        area = self.db['seg'][imname].attrs['area']
+        label = self.db['seg'][imname].attrs['label']
+
+        # re-size uniformly:
+        sz = depth.shape[:2][::-1]
+        rgb = np.array(img.resize(sz, Image.ANTIALIAS))
+        seg = np.array(Image.fromarray(seg).resize(sz, Image.NEAREST))
+        return rgb, depth, seg, area, label
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class SyntheticSceneSource(object):
+    """
+    Procedurally generated scenes, for benchmarks and tests which must
+    run without dset.h5: every scene is a grid of tilted planes (one
+    segmentation region each), textured with smooth noise.
+
+    Scene IDX is generated from SEED and IDX alone, so the scenes are
+    the same on every run and in every process.
+    """
+    def __init__(self, nscene=8, height=480, width=640, seed=0):
+        self.nscene = nscene
+        self.height = height
+        self.width = width
+        self.seed = seed
+
+    def names(self):
+        return ['synth%04d' % i for i in range(self.nscene)]
+
+    def load(self, imname):
+        idx = int(imname[len('synth'):])
+        rs = np.random.RandomState([self.seed, idx])
+        H, W = self.height, self.width
+
+        # split the image into a grid of planes:
+        nrow, ncol = rs.randint(1, 3), rs.randint(2, 4)
+        ys = np.r_[0, np.sort(rs.randint(H // 4, 3 * H // 4, nrow - 1)), H]
+        xs = np.r_[0, np.sort(rs.randint(W // 4, 3 * W // 4, ncol - 1)), W]
+        yy, xx = np.mgrid[0:H, 0:W].astype('float32')
+        depth = np.zeros((H, W), 'float32')
+        seg = np.zeros((H, W), 'float32')
+        rgb = np.zeros((H, W, 3), 'float32')
+        label = 0
+        for i in range(nrow):
+            for j in range(ncol):
+                label += 1
+                sl = np.s_[ys[i]:ys[i + 1], xs[j]:xs[j + 1]]
+                # depth plane: z = z0 + a*x + b*y (metres)
+                z0 = rs.uniform(3, 10)
+                a, b = rs.randn(2) * 0.003
+                depth[sl] = z0 + a * (xx[sl] - xs[j]) + b * (yy[sl] - ys[i])
+                seg[sl] = label
+                rgb[sl] = rs.uniform(40, 215, 3)
+
+        # texture: smooth noise, so that the colorizer sees some contrast
+        noise = rs.randn(H // 8 + 1, W // 8 + 1, 3).astype('float32')
+        noise = cv2.resize(noise, (W, H), interpolation=cv2.INTER_CUBIC)
+        rgb = np.clip(rgb + 20 * noise, 0, 255).astype('uint8')
+
+        label = np.arange(1, label + 1)
+        area = np.array([np.sum(seg == l) for l in label])
+        return rgb, depth, seg, area, label
+
+    def close(self):
+        pass
+
+
+class MemmapSceneSource(object):
+    """
+    Reads scenes from a pre-processed scene store (see write_scene_store):
+    flat, memory-mappable arrays of the already re-sized scenes.
+
+    load() returns zero-copy, read-only views into the mapping. The files
+    are mapped when the source is created, so that worker processes forked
+    afterwards share the one mapping (and its pages) with the parent.
+    """
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with np.load(osp.join(store_dir, 'index.npz')) as index:
+            self.imnames = [str(n) for n in index['names']]
+            self.shape = index['shape']
+            self.offset = index['offset']
+            self.label_offset = index['label_offset']
+            self.label = index['label']
+            self.area = index['area']
+            self.seg_dtype = str(index['seg_dtype'])
+        self.name_idx = {n: i for i, n in enumerate(self.imnames)}
+        self.open()
+
+    def open(self):
+        dtypes = {'rgb': 'uint8', 'depth': 'float32', 'seg': self.seg_dtype}
+        self.maps = {}
+        for k, dtype in dtypes.items():
+            self.maps[k] = np.memmap(osp.join(self.store_dir, k + '.bin'),
+                                     dtype=dtype,
+                                     mode='r')
+
+    def __getstate__(self):
+        # never pickle the (whole) mapped arrays, re-map instead:
+        state = self.__dict__.copy()
+        del state['maps']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.open()
+
+    def names(self):
+        return list(self.imnames)
+
+    def load(self, imname):
+        """
+        Returns (rgb, depth, seg, area, label) of the scene IMNAME.
+        """
+        i = self.name_idx[imname]
+        H, W = self.shape[i]
+        o, n = self.offset[i], H * W
+        rgb = self.maps['rgb'][3 * o:3 * (o + n)].reshape(H, W, 3)
+        depth = self.maps['depth'][o:o + n].reshape(H, W)
+        seg = self.maps['seg'][o:o + n].reshape(H, W)
+        l0, l1 = self.label_offset[i], self.label_offset[i + 1]
+        return rgb, depth, seg, self.area[l0:l1], self.label[l0:l1]
+
+    def close(self):
+        pass
+
+
+def write_scene_store(source, store_dir, imnames=None):
+    """
+    Converts the scenes IMNAMES (default: all) of SOURCE (e.g.
+    H5SceneSource) into a scene store for MemmapSceneSource:
+        rgb.bin   : uint8 HxWx3 images, re-sized to the depth resolution
+        depth.bin : float32 HxW depth
+        seg.bin   : HxW segmentation labels, in the smallest uint dtype
+        index.npz : names, shapes and offsets of the scenes, and their
+                    area/label attributes
+    """
+    if not osp.exists(store_dir):
+        os.makedirs(store_dir)
+    if imnames is None:
+        imnames = source.names()
+
+    shapes, offsets, areas, labels = [], [], [], []
+    fds = {k: open(osp.join(store_dir, k + '.bin'), 'wb')
+           for k in ['rgb', 'depth', 'seg']}
+    max_label, offset = 0, 0
+    for imname in imnames:
+        rgb, depth, seg, area, label = source.load(imname)
+        H, W = depth.shape[:2]
+        fds['rgb'].write(np.ascontiguousarray(rgb, 'uint8').tobytes())
+        fds['depth'].write(np.ascontiguousarray(depth, 'float32').tobytes())
+        # labels are stored as uint16, narrowed to uint8 below if possible:
+        fds['seg'].write(np.ascontiguousarray(seg, 'uint16').tobytes())
+        shapes.append((H, W))
+        offsets.append(offset)
+        areas.append(np.asarray(area))
+        labels.append(np.asarray(label))
+        max_label = max(max_label, int(np.max(seg)))
+        offset += H * W
+    for fd in fds.values():
+        fd.close()
+
+    seg_dtype = 'uint8' if max_label < 256 else 'uint16'
+    if seg_dtype == 'uint8':
+        seg_fp = osp.join(store_dir, 'seg.bin')
+        seg = np.memmap(seg_fp, dtype='uint16', mode='r')
+        with open(seg_fp + '.tmp', 'wb') as fd:
+            chunk = 1 << 24
+            for i in range(0, len(seg), chunk):
+                fd.write(seg[i:i + chunk].astype('uint8').tobytes())
+        del seg
+        os.replace(seg_fp + '.tmp', seg_fp)
+
+    np.savez(osp.join(store_dir, 'index.npz'),
+             names=np.array(imnames),
+             shape=np.array(shapes, 'int64').reshape(-1, 2),
+             offset=np.array(offsets, 'int64'),
+             label_offset=np.cumsum([0] + [len(l) for l in labels]),
+             label=np.concatenate(labels) if labels else np.zeros(0),
+             area=np.concatenate(areas) if areas else np.zeros(0),
+             seg_dtype=seg_dtype)
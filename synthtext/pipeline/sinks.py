@@ -0,0 +1,325 @@
+import io
+import os
+import os.path as osp
+import tarfile
+import time
+
+import h5py
+import numpy as np
+
+from .encoders import EncoderPool, PNGEncoder, decode
+
+
+def sanitize_key(key):
+    """
+    Sample keys are used as file-name stems; WebDataset splits
+    the member names at the first dot, so dots are not allowed.
+    """
+    return key.replace('.jpg', '').replace('.', '_').replace('/', '_')
+
+
+def fsync_path(fp):
+    fd = os.open(fp, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Sink(object):
+    """
+    Output sink for rendered samples.
+    A sample is a dict, e.g. {'img': HxWx3 uint8, 'txt': str}; it is
+    written under KEY, which must be unique within the output.
+    """
+    def write(self, key, sample):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def commit(self):
+        """
+        Marks the end of a group of samples (e.g. a scene).
+        Returns True iff everything written so far is safely on disk.
+        """
+        self.flush()
+        return True
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DirSink(Sink):
+    """
+    Writes every sample image as an individual file in OUT_DIR,
+    with the text label in the file name.
+    """
+    def __init__(self, out_dir, encoder=None):
+        self.out_dir = out_dir
+        self.encoder = PNGEncoder() if encoder is None else encoder
+        if not osp.exists(out_dir):
+            os.makedirs(out_dir)
+
+    def write(self, key, sample):
+        fp = '%s/%s_%s.%s' % (self.out_dir, sanitize_key(key),
+                              sample['txt'], self.encoder.ext)
+        with open(fp, 'wb') as fd:
+            fd.write(self.encoder.encode(sample['img']))
+
+
+class ShardSink(Sink):
+    """
+    Base class for sinks which batch samples in memory and write them
+    sequentially into numbered shards:
+        OUT_DIR/PREFIX-000000.EXT, OUT_DIR/PREFIX-000001.EXT, ...
+
+    The shards roll over in commit(), once they hold at least SHARD_SIZE
+    samples; committing after every scene keeps the samples of a scene
+    in a single shard. Numbering starts at FIRST_SHARD.
+
+    The sample images are encoded with ENCODER on NTHREAD threads
+    (see EncoderPool), so that write() and commit() only block on
+    compression when MAX_PENDING batches are already waiting, or when a
+    shard is completed.
+    """
+    ext = None
+
+    def __init__(self,
+                 out_dir,
+                 prefix='shard',
+                 shard_size=10000,
+                 batch_size=256,
+                 first_shard=0,
+                 encoder=None,
+                 nthread=4,
+                 max_pending=4):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        if encoder is None:
+            encoder = self.default_encoder()
+        self.encoder = encoder
+        self.pool = EncoderPool(encoder, nthread, max_pending)
+        if not osp.exists(out_dir):
+            os.makedirs(out_dir)
+
+        self.batch = []
+        self.shard_idx = first_shard - 1
+        self.shard_count = 0
+        self.shard_fp = None
+        self.nsample = 0
+        # samples handed to the encoders, but not yet written:
+        self.npending = 0
+
+    def shard_path(self, idx):
+        return osp.join(self.out_dir,
+                        '%s-%06d.%s' % (self.prefix, idx, self.ext))
+
+    def write(self, key, sample):
+        self.batch.append((sanitize_key(key), sample))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def default_encoder(self):
+        return PNGEncoder()
+
+    def flush(self, wait=False):
+        """
+        Hands the current batch to the encoders, and writes out the
+        batches which are encoded (all of them if WAIT).
+        """
+        batch, self.batch = self.batch, []
+        if len(batch) > 0:
+            self.pool.submit(batch)
+            self.npending += len(batch)
+        for batch, encoded in self.pool.ready(wait):
+            if self.shard_fp is None:
+                self.shard_idx += 1
+                self.shard_count = 0
+                self.shard_fp = self.shard_path(self.shard_idx)
+                self.open_shard(self.shard_fp)
+            self.write_batch(batch, encoded)
+            self.shard_count += len(batch)
+            self.nsample += len(batch)
+            self.npending -= len(batch)
+
+    def commit(self):
+        self.flush()
+        if self.shard_count + self.npending >= self.shard_size:
+            self.flush(wait=True)
+            self.finish_shard()
+            return True
+        return False
+
+    def finish_shard(self):
+        if self.shard_fp is not None:
+            self.close_shard()
+            fsync_path(self.shard_fp)
+            self.shard_fp = None
+            self.shard_count = 0
+
+    def close(self):
+        self.flush(wait=True)
+        self.finish_shard()
+        self.pool.close()
+
+    def open_shard(self, fp):
+        raise NotImplementedError
+
+    def close_shard(self):
+        raise NotImplementedError
+
+    def write_batch(self, batch, encoded):
+        """
+        BATCH   : list of (key, sample)
+        ENCODED : the encoded sample images (None if not encoded)
+        """
+        raise NotImplementedError
+
+
+class TarShardSink(ShardSink):
+    """
+    WebDataset-style tar shards: every sample is stored as a group of
+    members sharing the sample key, one per field:
+        KEY.png  : the image (or .jpg/.npy, depending on the encoder)
+        KEY.txt  : the text label(s), one per line
+        KEY.npy  : any other array field (e.g. KEY.charBB.npy)
+    """
+    ext = 'tar'
+
+    def open_shard(self, fp):
+        self.tar = tarfile.open(fp, 'w')
+
+    def close_shard(self):
+        self.tar.close()
+
+    def encode(self, name, value):
+        if isinstance(value, str):
+            return 'txt', value.encode('utf-8')
+        if isinstance(value, (list, tuple)):
+            return 'txt', '\n'.join(value).encode('utf-8')
+        buf = io.BytesIO()
+        np.save(buf, np.asarray(value))
+        return 'npy', buf.getvalue()
+
+    def write_batch(self, batch, encoded):
+        mtime = time.time()
+        for (key, sample), img in zip(batch, encoded):
+            for name, value in sample.items():
+                if name == 'img':
+                    ext, data = self.encoder.ext, img
+                else:
+                    ext, data = self.encode(name, value)
+                if name in ('img', 'txt'):
+                    fname = '%s.%s' % (key, ext)
+                else:
+                    fname = '%s.%s.%s' % (key, name, ext)
+                info = tarfile.TarInfo(fname)
+                info.size = len(data)
+                info.mtime = mtime
+                self.tar.addfile(info, io.BytesIO(data))
+
+
+class H5ShardSink(ShardSink):
+    """
+    Chunked HDF5 shards. Every sample field is a resizable dataset with
+    one row per sample, written a batch at a time:
+        key          : sample keys (str)
+        NAME         : flattened array values (variable length)
+        NAME_shape   : the shape of each array value
+        NAME         : str values (lists of str are joined by newlines)
+    By default the images are stored as raw arrays; with an ENCODER they
+    are stored as encoded bytes instead (attribute 'img_encoding').
+    """
+    ext = 'h5'
+
+    def default_encoder(self):
+        return None
+
+    def open_shard(self, fp):
+        self.db = h5py.File(fp, 'w')
+        if self.encoder is not None:
+            self.db.attrs['img_encoding'] = self.encoder.ext
+
+    def close_shard(self):
+        self.db.close()
+
+    def get_dataset(self, name, dtype):
+        if name not in self.db:
+            self.db.create_dataset(name, (0, ),
+                                   maxshape=(None, ),
+                                   chunks=(self.batch_size, ),
+                                   dtype=dtype)
+        return self.db[name]
+
+    def append(self, name, dtype, values):
+        dset = self.get_dataset(name, dtype)
+        n = dset.shape[0]
+        dset.resize((n + len(values), ))
+        vlen = h5py.check_vlen_dtype(dset.dtype)
+        if vlen is not None and vlen is not str:
+            # h5py would try to stack same-sized arrays into a 2d array:
+            for i, v in enumerate(values):
+                dset[n + i] = v
+        else:
+            dset[n:] = values
+
+    def write_batch(self, batch, encoded):
+        str_t = h5py.string_dtype()
+        self.append('key', str_t, [key for key, _ in batch])
+        for name in batch[0][1].keys():
+            values = [sample[name] for _, sample in batch]
+            if name == 'img' and self.encoder is not None:
+                values = [np.frombuffer(v, 'uint8') for v in encoded]
+                self.append(name, h5py.vlen_dtype('uint8'), values)
+            elif isinstance(values[0], (str, list, tuple)):
+                values = [v if isinstance(v, str) else '\n'.join(v)
+                          for v in values]
+                self.append(name, str_t, values)
+            else:
+                values = [np.asarray(v) for v in values]
+                vlen_t = h5py.vlen_dtype(values[0].dtype)
+                self.append(name, vlen_t, [v.ravel() for v in values])
+                shapes = np.array([v.shape for v in values], 'int32')
+                dset = self.db.get(name + '_shape')
+                if dset is None:
+                    self.db.create_dataset(name + '_shape',
+                                           (0, shapes.shape[1]),
+                                           maxshape=(None, shapes.shape[1]),
+                                           chunks=(self.batch_size,
+                                                   shapes.shape[1]),
+                                           dtype='int32')
+                    dset = self.db[name + '_shape']
+                n = dset.shape[0]
+                dset.resize((n + len(shapes), shapes.shape[1]))
+                dset[n:] = shapes
+
+
+def read_h5_shard(fp):
+    """
+    Yields (key, sample) for every sample in the H5ShardSink shard FP.
+    """
+    with h5py.File(fp, 'r') as db:
+        names = [k for k in db.keys()
+                 if k != 'key' and not k.endswith('_shape')]
+        keys = db['key'].asstr()[:]
+        encoding = db.attrs.get('img_encoding')
+        for i, key in enumerate(keys):
+            sample = {}
+            for name in names:
+                if name == 'img' and encoding is not None:
+                    sample[name] = decode(db[name][i].tobytes(), encoding)
+                elif name + '_shape' in db:
+                    shape = db[name + '_shape'][i]
+                    sample[name] = db[name][i].reshape(shape)
+                else:
+                    sample[name] = db[name].asstr()[i]
+            yield key, sample
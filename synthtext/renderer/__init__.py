@@ -1 +1,2 @@
 from .renderer import Renderer
+from .region_cache import RegionCache
@@ -0,0 +1,113 @@
+import numpy as np
+
+import cv2
+
+
+class LabelIndex(object):
+    """
+    Per-label statistics of a segmentation, computed in a single pass
+    over the image and shared by all the stages of the region analysis
+    (instead of every stage computing SEG == L over the whole image).
+
+    For every label: the flat indices of its pixels (in raster order,
+    i.e. the order of np.where(seg == l)), its bounding box, and its
+    convex hull (computed on first use).
+    """
+    def __init__(self, seg):
+        self.shape = seg.shape[:2]
+        flat = np.asarray(seg).ravel()
+        if flat.dtype.kind == 'f' or flat.dtype.itemsize > 2:
+            # labels are small integers (stored as float in dset.h5):
+            # with a 16 bit key, the stable sort is a radix sort
+            if flat.size > 0 and 0 <= flat.min() and flat.max() < 2**16:
+                flat = flat.astype('uint16')
+        order = np.argsort(flat, kind='stable')
+        sorted_labels = flat[order]
+        start = np.r_[0, np.flatnonzero(np.diff(sorted_labels)) + 1]
+        self.labels = sorted_labels[start]
+        self.start = np.r_[start, flat.size]
+        self.order = order
+
+        # bounding boxes of all the labels at once:
+        rows, cols = np.divmod(order, self.shape[1])
+        self.rmin = np.minimum.reduceat(rows, start)
+        self.rmax = np.maximum.reduceat(rows, start)
+        self.cmin = np.minimum.reduceat(cols, start)
+        self.cmax = np.maximum.reduceat(cols, start)
+        self._rows, self._cols = rows, cols
+        self._hulls = {}
+
+    def _index(self, l):
+        i = np.searchsorted(self.labels, l)
+        if i == len(self.labels) or self.labels[i] != l:
+            raise KeyError('label %s is not in the segmentation' % l)
+        return i
+
+    def count(self, l):
+        """
+        No. of pixels of label L.
+        """
+        i = self._index(l)
+        return self.start[i + 1] - self.start[i]
+
+    def pixels(self, l):
+        """
+        Flat indices of the pixels of label L, in raster order.
+        """
+        i = self._index(l)
+        return self.order[self.start[i]:self.start[i + 1]]
+
+    def coords(self, l):
+        """
+        (rows, cols) of the pixels of label L, as np.where(seg == l).
+        """
+        i = self._index(l)
+        s = slice(self.start[i], self.start[i + 1])
+        return self._rows[s], self._cols[s]
+
+    def bbox(self, l):
+        """
+        (row slice, column slice) of the bounding box of label L,
+        as given by scipy.ndimage.find_objects.
+        """
+        i = self._index(l)
+        return (slice(self.rmin[i], self.rmax[i] + 1),
+                slice(self.cmin[i], self.cmax[i] + 1))
+
+    def mask(self, l, crop=False, pad=0):
+        """
+        Binary mask of label L; if CROP, only over its bounding box,
+        grown by PAD pixels (within the image).
+        Returns the mask, and the (row, column) offset of the mask
+        in the image.
+        """
+        rows, cols = self.coords(l)
+        if crop:
+            i = self._index(l)
+            r0, c0 = max(self.rmin[i] - pad, 0), max(self.cmin[i] - pad, 0)
+            r1 = min(self.rmax[i] + pad + 1, self.shape[0])
+            c1 = min(self.cmax[i] + pad + 1, self.shape[1])
+            shape = (r1 - r0, c1 - c0)
+        else:
+            r0, c0 = 0, 0
+            shape = self.shape
+        mask = np.zeros(shape, 'bool')
+        mask[rows - r0, cols - c0] = True
+        return mask, (r0, c0)
+
+    def hull(self, l):
+        """
+        Convex hull of the pixels of label L: kx2 float32 (row, column)
+        points.
+        """
+        i = self._index(l)
+        if i not in self._hulls:
+            rows, cols = self.coords(l)
+            # the hull of the first and last pixel of every row is that
+            # of all the pixels (pixels are in raster order):
+            first = np.r_[0, np.flatnonzero(np.diff(rows)) + 1]
+            last = np.r_[first[1:] - 1, len(rows) - 1]
+            ends = np.r_[first, last]
+            pts = np.c_[rows[ends], cols[ends]].astype('float32')
+            self._hulls[i] = cv2.convexHull(pts)[:, 0, :]
+        return self._hulls[i]
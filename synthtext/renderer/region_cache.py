@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import os.path as osp
+
+import numpy as np
+
+import synthtext.synth as synth
+from synthtext.config import CFG
+
+# bump when the cached fields / their meaning change
+# (2: RANSAC samples drawn from per-scene Generator streams,
+#  3: the streams derived from the scene name instead of its index)
+VERSION = 3
+
+# options of CFG.TextRegions which do not change the regions:
+UNHASHED = ('region_threads', )
+
+
+def config_hash(seed):
+    """
+    Hash of everything, besides the scene, that Renderer.get_regions
+    depends on, including the root SEED of the RANSAC samples.
+    """
+    cfg = {
+        'version': VERSION,
+        'seed': seed,
+        'text_regions': {
+            k: v
+            for k, v in CFG.TextRegions.items() if k not in UNHASHED
+        },
+        'camera_f': synth.DepthCamera.f,
+    }
+    cfg = json.dumps(cfg, sort_keys=True, default=str)
+    return hashlib.md5(cfg.encode('utf-8')).hexdigest()[:12]
+
+
+class RegionCache(object):
+    """
+    On-disk cache of the output of Renderer.get_regions, one .npz file
+    per scene under CACHE_DIR/<config hash>/. Scenes without any region
+    suitable for text are recorded as well (with no regions).
+    SEED : root seed of the run; the RANSAC samples of a scene are drawn
+           from derive_rng(seed, imname, 'regions').
+
+    The cached fields are: label, coeff, rot, area, place_mask,
+    homography and homography_inv (the RANSAC inlier masks, 'support',
+    are not used for placing text and are not stored).
+    """
+    def __init__(self, cache_dir, seed=0):
+        self.cache_dir = osp.join(cache_dir, config_hash(seed))
+        if not osp.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def path(self, imname):
+        key = imname.replace('/', '_')
+        return osp.join(self.cache_dir, key + '.npz')
+
+    def nregions(self, imname):
+        """
+        Returns the number of cached regions of IMNAME,
+        None if the scene is not in the cache.
+        """
+        fp = self.path(imname)
+        if not osp.exists(fp):
+            return
+        with np.load(fp) as data:
+            return int(data['nregions'])
+
+    def get(self, imname):
+        """
+        Returns the cached regions of IMNAME, None if not in the cache.
+        """
+        fp = self.path(imname)
+        if not osp.exists(fp):
+            return
+        with np.load(fp) as data:
+            n = int(data['nregions'])
+            regions = {
+                'label': list(data['label']),
+                'coeff': list(data['coeff']),
+                'rot': list(data['rot']),
+                'area': list(data['area']),
+                'homography': list(data['homography']),
+                'homography_inv': list(data['homography_inv']),
+                'place_mask': [data['place_mask_%d' % i] for i in range(n)],
+            }
+        return regions
+
+    def put(self, imname, regions):
+        n = len(regions['place_mask'])
+        data = {
+            'nregions': np.array(n),
+            'label': np.array(regions['label']).reshape(n),
+            'coeff': np.array(regions['coeff']).reshape(n, 4),
+            'rot': np.array([
+                np.full((2, 2), np.nan) if r is None else r
+                for r in regions['rot']
+            ]).reshape(n, 2, 2),
+            'area': np.array(regions['area']).reshape(n),
+            'homography': np.array(regions['homography']).reshape(n, 3, 3),
+            'homography_inv': np.array(
+                regions['homography_inv']).reshape(n, 3, 3),
+        }
+        for i in range(n):
+            data['place_mask_%d' % i] = regions['place_mask'][i]
+
+        # write-then-rename, so that readers never see a partial file:
+        fp = self.path(imname)
+        tmp_fp = '%s.%d.tmp.npz' % (fp[:-4], os.getpid())
+        np.savez_compressed(tmp_fp, **data)
+        os.replace(tmp_fp, fp)
@@ -1,4 +1,3 @@
-import copy
 import h5py
 from PIL import Image
 import numpy as np
@@ -7,27 +6,48 @@ import matplotlib.pyplot as plt
 import os.path as osp
 import scipy.ndimage as sim
 import scipy.spatial.distance as ssd
-import traceback, itertools
+import traceback
 
 import cv2
 
+import synthtext.bbox as bbox
 import synthtext.synth as synth
 import synthtext.text_renderer as text_renderer
+from synthtext.bbox import get_bounding_rect, get_crops, filter_valid
 from synthtext.colorizer import Colorizer
-from synthtext.common import TimeoutException, time_limit
+from synthtext.common import NO_DEADLINE, Deadline, TimeoutException
+from synthtext.common import derive_rng
 from synthtext.config import load_cfg
+from synthtext.timing import timed
 
+from .label_index import LabelIndex
 from .text_regions import TEXT_REGIONS
 from .utils import rescale_frontoparallel, get_text_placement_mask
-from .utils import get_bounding_rect, get_crops, filter_valid
+from .utils import CollisionMasks
 from .viz import viz_textbb, viz_images
 
+# margin (px) of the window the text is warped into: the radius of the
+# largest feathering kernel (see Renderer.feather) + 1:
+ROI_PAD = 3
+
 
 class Renderer(object):
-    def __init__(self):
+    def __init__(self, rng=None):
         load_cfg(self)
         self.text_render = text_renderer.TextRenderer()
         self.colorizer = Colorizer()
+        self.set_rng(rng)
+        # no. of placements aborted for exceeding MAX_TIME, per stage:
+        self.budget_exceeded = {}
+
+    def set_rng(self, rng=None):
+        """
+        RNG : numpy.random.Generator to draw from (None: a fresh one),
+              shared with the text renderer and the colorizer.
+        """
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.text_render.set_rng(self.rng)
+        self.colorizer.set_rng(self.rng)
 
     def filter_regions(self, regions, filt):
         """
@@ -38,14 +58,25 @@ class Renderer(object):
             regions[k] = [regions[k][i] for i in idx]
         return regions
 
-    def filter_for_placement(self, xyz, seg, regions):
+    def filter_for_placement(self, xyz, seg, regions, index=None):
+        if index is None:
+            index = LabelIndex(seg)
+        def placement_mask(idx):
+            l = regions['label'][idx]
+            # the mask over the bounding box of the region (with a margin
+            # of 1 px, so that the contours are as in the whole image):
+            mask, offset = index.mask(l, crop=True, pad=1)
+            return get_text_placement_mask(xyz,
+                                           mask,
+                                           regions['coeff'][idx],
+                                           pad=2,
+                                           offset=offset)
+
         filt = np.zeros(len(regions['label'])).astype('bool')
         masks, Hs, Hinvs = [], [], []
-        for idx, l in enumerate(regions['label']):
-            res = get_text_placement_mask(xyz,
-                                          seg == l,
-                                          regions['coeff'][idx],
-                                          pad=2)
+        nregions = len(regions['label'])
+        for idx, res in enumerate(
+                TEXT_REGIONS.map_regions(placement_mask, range(nregions))):
             if res is not None:
                 mask, H, Hinv = res
                 masks.append(mask)
@@ -59,6 +90,7 @@ class Renderer(object):
 
         return regions
 
+    @timed('warp')
     def warpHomography(self, src_mat, H, dst_size):
         dst_mat = cv2.warpPerspective(src_mat,
                                       H,
@@ -75,23 +107,7 @@ class Renderer(object):
 
         offset : a 2-tuple (dx,dy), added to points before transfomation.
         """
-        eps = 1e-16
-        # check the shape of the BB array:
-        t, f, n = bbs.shape
-        assert (t == 2) and (f == 4)
-
-        # append 1 for homogenous coordinates:
-        bbs_h = np.reshape(np.r_[bbs, np.ones((1, 4, n))], (3, 4 * n),
-                           order='F')
-        if offset != None:
-            bbs_h[:2, :] += np.array(offset)[:, None]
-
-        # perpective:
-        bbs_h = H.dot(bbs_h)
-        bbs_h /= (bbs_h[2, :] + eps)
-
-        bbs_h = np.reshape(bbs_h, (3, 4, n), order='F')
-        return bbs_h[:2, :, :]
+        return bbox.homography_transform(bbs, H, offset)
 
     def bb_filter(self, bb0, bb, text):
         """
@@ -145,16 +161,21 @@ class Renderer(object):
             bsz = 0.25
             ksz = 1
         elif 15 < min_h < 30:
-            bsz = max(0.30, 0.5 + 0.1 * np.random.randn())
+            bsz = max(0.30, 0.5 + 0.1 * self.rng.standard_normal())
             ksz = 3
         else:
-            bsz = max(0.5, 1.5 + 0.5 * np.random.randn())
+            bsz = max(0.5, 1.5 + 0.5 * self.rng.standard_normal())
             ksz = 5
         return cv2.GaussianBlur(text_mask, (ksz, ksz), bsz)
 
-    def place_text(self, rgb, collision_mask, H, Hinv):
-
-        render_res = self.text_render.render_text(collision_mask)
+    def place_text(self, rgb, collision_mask, H, Hinv, deadline=NO_DEADLINE):
+        """
+        Renders text into the free space of COLLISION_MASK (which is not
+        modified) and blends it into RGB.
+        Returns (image, text, charBB, text mask, curve flag), where the
+        text mask is in the rectified frame of COLLISION_MASK; or None.
+        """
+        render_res = self.text_render.render_text(collision_mask, deadline)
         if render_res is None:  # rendering not successful
             return  #None
         else:
@@ -162,17 +183,16 @@ class Renderer(object):
             #if not curve_flag:
             #    return
 
-        # update the collision mask with text:
-        collision_mask += (255 * (text_mask > 0)).astype('uint8')
+        # the caller updates the collision mask, if the text is used:
+        text_mask_rect = text_mask
 
         # warp the object mask back onto the image:
-        text_mask_orig = text_mask.copy()
 
         ######### start #########
-        #viz_textbb(1, text_mask_orig, [wordBB], alpha=1.0)
+        #viz_textbb(1, text_mask_rect, [wordBB], alpha=1.0)
         #fignum = 1
         #plt.figure(fignum)
-        #plt.imshow(text_mask_orig)
+        #plt.imshow(text_mask_rect)
         #plt.show(block=False)
         #import pdb
         #pdb.set_trace()
@@ -181,45 +201,44 @@ class Renderer(object):
         ######### end #########
 
         bb_orig = bb.copy()
-        text_mask = self.warpHomography(text_mask, H, rgb.shape[:2][::-1])
         bb = self.homographyBB(bb, Hinv)
-
-        ### start
-        #wordBB = self.char2wordBB(bb.copy(), text)
-        #viz_textbb(1, text_mask, [wordBB], alpha=1.0)
-
-        #fy = rgb.shape[0] / text_mask.shape[0] # height
-        #fx = rgb.shape[1] / text_mask.shape[1] # width
-        #text_mask = cv2.resize(text_mask, rgb.shape[:2][::-1])
-        #bb = np.array([[fx], [fy]])[:, :, None] * bb
-
-        #wordBB = self.char2wordBB(bb.copy(), text)
-        #viz_textbb(2, text_mask, [wordBB], alpha=1.0)
-        #import pdb
-        #pdb.set_trace()
-        ### end
-
         if not self.bb_filter(bb_orig, bb, text):
             #warn('bad charBB statistics')
             return  #None
 
+        # warp the text only into its window in the image, grown by the
+        # support of the interpolation and of the feathering blur:
+        x, y, w, h = cv2.boundingRect(text_mask_rect)
+        roi = bbox.homography_roi([x - 1, y - 1, w + 1, h + 1], Hinv,
+                                  rgb.shape, pad=ROI_PAD)
+        if roi is None:
+            return  #None
+        x0, y0, x1, y1 = roi
+        T = np.array([[1, 0, x0], [0, 1, y0], [0, 0, 1]], 'float64')
+        text_mask = self.warpHomography(text_mask, H.dot(T),
+                                        (x1 - x0, y1 - y0))
+
         # get the minimum height of the character-BB:
         min_h = self.get_min_h(bb, text)
 
         #feathering:
         text_mask = self.feather(text_mask, min_h)
+        deadline.check('place_text')
 
-        im_final = self.colorizer.colorize(rgb, [text_mask], np.array([min_h]))
+        im_final = self.colorizer.colorize(rgb, [text_mask],
+                                           np.array([min_h]),
+                                           text_loc=[(y0, x0)],
+                                           deadline=deadline)
 
-        return im_final, text, bb, collision_mask, curve_flag
+        return im_final, text, bb, text_mask_rect, curve_flag
 
     def get_num_text_regions(self, nregions):
         #return nregions
         nmax = min(self.max_text_regions, nregions)
-        if np.random.rand() < 0.10:
-            rnd = np.random.rand()
+        if self.rng.random() < 0.10:
+            rnd = self.rng.random()
         else:
-            rnd = np.random.beta(5.0, 1.0)
+            rnd = self.rng.beta(5.0, 1.0)
         return int(np.ceil(nmax * rnd))
 
     def char2wordBB(self, charBB, text):
@@ -233,36 +252,40 @@ class Renderer(object):
         output : 2x4xm matrix of BB coordinates,
                  where, m == number of words.
         """
-        wrds = text.split()
-        bb_idx = np.r_[0, np.cumsum([len(w) for w in wrds])]
-        wordBB = np.zeros((2, 4, len(wrds)), 'float32')
-
-        for i in range(len(wrds)):
-            cc = charBB[:, :, bb_idx[i]:bb_idx[i + 1]]
-
-            # fit a rotated-rectangle:
-            # change shape from 2x4xn_i -> (4*n_i)x2
-            cc = np.squeeze(np.concatenate(np.dsplit(cc, cc.shape[-1]),
-                                           axis=1)).T.astype('float32')
-            rect = cv2.minAreaRect(cc.copy())
-            box = np.array(cv2.boxPoints(rect))
-
-            # find the permutation of box-coordinates which
-            # are 'aligned' appropriately with the character-bb.
-            # (exhaustive search over all possible assignments):
-            cc_tblr = np.c_[cc[0, :], cc[-3, :], cc[-2, :], cc[3, :]].T
-            perm4 = np.array(list(itertools.permutations(np.arange(4))))
-            dists = []
-            for pidx in range(perm4.shape[0]):
-                d = np.sum(
-                    np.linalg.norm(box[perm4[pidx], :] - cc_tblr, axis=1))
-                dists.append(d)
-            wordBB[:, :, i] = box[perm4[np.argmin(dists)], :].T
-
-        return wordBB
+        return bbox.char2wordBB(charBB, text)
+
+    def get_regions(self, depth, seg, area, label, rng=None):
+        """
+        Finds the regions of the scene in which text can be placed,
+        along with their placement masks and homographies.
+        The result depends only on the scene and the configuration
+        (and RNG, through RANSAC; default: self.rng).
+        """
+        # depth -> xyz, back-projected only where needed:
+        xyz = synth.DepthXYZ(depth)
+
+        # per-label pixels and bounding boxes, shared by all the stages:
+        index = LabelIndex(seg)
+
+        # find text-regions:
+        rng = self.rng if rng is None else rng
+        regions = TEXT_REGIONS.get_regions(xyz, seg, area, label, rng, index)
+
+        # find the placement mask and homographies:
+        regions = self.filter_for_placement(xyz, seg, regions, index)
+        return regions
 
     # main
-    def render(self, rgb, depth, seg, area, label, ninstance=1, viz=False):
+    def iter_render(self,
+                    rgb,
+                    depth,
+                    seg,
+                    area,
+                    label,
+                    ninstance=1,
+                    viz=False,
+                    regions=None,
+                    seed=None):
         """
         rgb   : HxWx3 image rgb values (uint8)
         depth : HxW depth values (float)
@@ -273,10 +296,18 @@ class Renderer(object):
                constitute a region mask
         ninstance : no of times image should be
                     used to place text.
+        regions : output of get_regions, if already computed
+                  (e.g. cached) for this scene.
+        seed  : key of the scene, e.g. (seed, scene index); instance i
+                then draws from its own stream, derive_rng(seed, i).
+                If None, all instances draw from self.rng.
+
+        Yields the result of every instance as soon as it is finished,
+        so that it can be written out and freed before the next one.
 
         @return:
-            res : a list of dictionaries, one for each of 
-                  the image instances.
+            a generator of dictionaries, one for each of the
+                  image instances in which text was placed.
                   Each dictionary has the following structure:
                       'img' : rgb-image with text on it.
                       'bb'  : 2x4xn matrix of bounding-boxes
@@ -287,38 +318,21 @@ class Renderer(object):
                   i-th non-space white-character in txt is at bb[:,:,i].
             
             If there's an error in pre-text placement, for e.g. if there's 
-            no suitable region for text placement, an empty list is returned.
+            no suitable region for text placement, nothing is yielded.
         """
-        #try:
-        # depth -> xyz
-        # TODO: debug
-        #np.random.seed(0)
-        #depth = 100 + 0.00 * np.random.rand(*depth.shape)
-        xyz = synth.DepthCamera.depth2xyz(depth)
-        #import pdb
-        #pdb.set_trace()
-        #xyz = 100 + 0.0 * np.random.rand(*xyz.shape)
-
-        # find text-regions:
-        regions = TEXT_REGIONS.get_regions(xyz, seg, area, label)
-
-        # find the placement mask and homographies:
-        regions = self.filter_for_placement(xyz, seg, regions)
+        if regions is None:
+            regions = self.get_regions(depth, seg, area, label)
 
         # finally place some text:
         nregions = len(regions['place_mask'])
         if nregions < 1:  # no good region to place text on
-            return []
-        #except:
-        # failure in pre-text placement
-        #import traceback
-        #    traceback.print_exc()
-        #    return []
-
-        res = []
+            return
+
         for i in range(ninstance):
             print('-----Instance %d-----' % i)
-            place_masks = copy.deepcopy(regions['place_mask'])
+            if seed is not None:
+                self.set_rng(derive_rng(seed, i))
+            place_masks = CollisionMasks(regions['place_mask'])
 
             idict = {'img': [], 'charBB': None, 'wordBB': None, 'txt': None}
 
@@ -326,12 +340,14 @@ class Renderer(object):
                 nregions
             )  #np.arange(nregions)#min(nregions, 5*ninstance*self.max_text_regions))
             reg_idx = np.arange(min(2 * m, nregions))
-            np.random.shuffle(reg_idx)
+            self.rng.shuffle(reg_idx)
             reg_idx = reg_idx[:m]
 
             img = rgb.copy()
             itext = []
-            ibb = []
+            # the boxes of the characters and of the words placed so far:
+            ichar_bb = bbox.BoxBuffer(dtype='float64')
+            iword_bb = bbox.BoxBuffer(dtype='float32')
 
             # process regions:
             num_txt_regions = len(reg_idx)
@@ -340,18 +356,12 @@ class Renderer(object):
             placed = False
             for idx in reg_range:
                 ireg = reg_idx[idx]
+                # every placement gets MAX_TIME seconds (None: no limit):
+                deadline = Deadline(self.max_time, self.budget_exceeded)
                 try:
-                    if self.max_time is None:
-                        txt_render_res = self.place_text(
-                            img, place_masks[ireg],
-                            regions['homography'][ireg],
-                            regions['homography_inv'][ireg])
-                    else:
-                        with time_limit(self.max_time):
-                            txt_render_res = self.place_text(
-                                img, place_masks[ireg],
-                                regions['homography'][ireg],
-                                regions['homography_inv'][ireg])
+                    txt_render_res = self.place_text(
+                        img, place_masks[ireg], regions['homography'][ireg],
+                        regions['homography_inv'][ireg], deadline)
                 except TimeoutException as e:
                     print(e)
                     continue
@@ -362,12 +372,14 @@ class Renderer(object):
 
                 if txt_render_res is not None:
                     placed = True
-                    img, text, bb, collision_mask, curve_flag = txt_render_res
+                    img, text, bb, text_mask, curve_flag = txt_render_res
                     # update the region collision mask:
-                    place_masks[ireg] = collision_mask
-                    # store the result:
+                    place_masks.add_text(ireg, text_mask)
+                    # store the result; the words of one text are
+                    # boxed independently of the others:
                     itext.append(text)
-                    ibb.append(bb)
+                    ichar_bb.append(bb)
+                    iword_bb.append(self.char2wordBB(bb.copy(), text))
 
                     #print('-----<text-----')
                     #if curve_flag:
@@ -377,14 +389,13 @@ class Renderer(object):
                     #print(text)
                     #print('-----text>-----')
 
-                    # at least 1 word was placed in this instance:
-                    idict['img'] = img
-                    idict['txt'] = itext
-                    idict['charBB'] = np.concatenate(ibb, axis=2)
-                    idict['wordBB'] = self.char2wordBB(idict['charBB'].copy(),
-                                                       ' '.join(itext))
-                    res.append(idict.copy())
             if placed:
+                # at least 1 word was placed in this instance:
+                idict['img'] = img
+                idict['txt'] = itext
+                idict['charBB'] = ichar_bb.array()
+                idict['wordBB'] = iword_bb.array()
+                yield idict
                 if viz:
 
                     #min_area_rect = idict['wordBB']
@@ -404,4 +415,21 @@ class Renderer(object):
                     # viz_regions(rgb.copy(),xyz,seg,regions['coeff'],regions['label'])
                     if i < ninstance - 1:
                         input('continue?')
-        return res
+
+    def render(self,
+               rgb,
+               depth,
+               seg,
+               area,
+               label,
+               ninstance=1,
+               viz=False,
+               regions=None,
+               seed=None):
+        """
+        Renders all the instances at once: the list of the results of
+        iter_render (see there for the arguments).
+        """
+        return list(
+            self.iter_render(rgb, depth, seg, area, label, ninstance, viz,
+                             regions, seed))
@@ -1,3 +1,6 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 import cv2
@@ -5,14 +8,45 @@ import cv2
 from synthtext.config import load_cfg
 import synthtext.synth as synth
 
+from .label_index import LabelIndex
+
 
 class TextRegions(object):
     """
     Get region from segmentation which are good for placing
     text.
     """
-    def __init__(self):
+    def __init__(self, rng=None):
         load_cfg(self)
+        self.rng = np.random.default_rng() if rng is None else rng
+        # RANSAC hypotheses drawn / saved, summed over the regions
+        # (see synth.ransac.fit_plane_ransac):
+        self.ransac_counts = {}
+        self._pool, self._pool_pid = None, None
+
+    def map_regions(self, fn, items):
+        """
+        [fn(item) for item in ITEMS], run on REGION_THREADS threads
+        (the per-region work is mostly in NumPy / OpenCV, which release
+        the GIL). The results are in the order of ITEMS.
+        """
+        if self.region_threads <= 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+        # threads do not survive a fork: one pool per process
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(self.region_threads)
+            self._pool_pid = os.getpid()
+        return list(self._pool.map(fn, items))
+
+    def ransac_options(self):
+        """
+        Keyword arguments of the preemptive RANSAC, or None.
+        """
+        if not self.ransac_preemptive:
+            return None
+        return dict(subset=self.ransac_subset,
+                    block=self.ransac_block,
+                    confidence=self.ransac_confidence)
 
     def get_hw(self, pt, return_rot=False):
         pt = pt.copy()
@@ -24,24 +58,30 @@ class TextRegions(object):
             return h, w, R
         return h, w
 
-    def filter(self, seg, area, label):
+    def filter(self, seg, area, label, index=None, scale=1):
         """
         Apply the filter.
         The final list is ranked by area.
+        INDEX : LabelIndex of SEG (computed if None).
+        SCALE : SEG is downsampled by SCALE (the size limits are scaled).
         """
-        good = label[area > self.min_area]
-        area = area[area > self.min_area]
+        if index is None:
+            index = LabelIndex(seg)
+        min_area = self.min_area / scale**2
+        min_height, min_width = self.min_height / scale, self.min_width / scale
+        # LABEL / AREA are measured on the stored segmentation, which is
+        # resized to the depth: some of the labels may be gone from SEG
+        keep = (area > min_area) & np.isin(label, index.labels)
+        good = label[keep]
+        area = area[keep]
         filt, R = [], []
         for idx, i in enumerate(good):
-            mask = seg == i
-            xs, ys = np.where(mask)
-
-            coords = np.c_[xs, ys].astype('float32')
-            rect = cv2.minAreaRect(coords)
+            # the min-area rectangle of the region is that of its hull:
+            rect = cv2.minAreaRect(index.hull(i))
             box = np.array(cv2.boxPoints(rect))
             h, w, rot = self.get_hw(box, return_rot=True)
 
-            f = (h > self.min_height and w > self.min_width
+            f = (h > min_height and w > min_width
                  and self.min_aspect < w / h < self.max_aspect
                  and area[idx] / w * h > self.p_area)
             filt.append(f)
@@ -59,18 +99,19 @@ class TextRegions(object):
         filter_info = {'label': good, 'rot': R, 'area': area[aidx]}
         return filter_info
 
-    def sample_grid_neighbours(self, mask, nsample, step=3):
+    def sample_grid_neighbours(self, mask, nsample, step=3, rng=None):
         '''
         Given a HxW binary mask, sample 4 neighbours on the grid,
         in the cardinal directions, STEP pixels away.
         '''
+        rng = self.rng if rng is None else rng
         if 2 * step >= min(mask.shape[:2]):
             return  #None
+        mask = np.asarray(mask, 'bool')
 
-        y_m, x_m = np.where(mask)
-        mask_idx = np.zeros_like(mask, 'int32')
-        for i in range(len(y_m)):
-            mask_idx[y_m[i], x_m[i]] = i
+        # index of every mask pixel, in raster order:
+        mask_idx = np.zeros(mask.shape, 'int32')
+        mask_idx[mask] = np.arange(np.count_nonzero(mask), dtype='int32')
 
         xp, xn = np.zeros_like(mask), np.zeros_like(mask)
         yp, yn = np.zeros_like(mask), np.zeros_like(mask)
@@ -85,23 +126,33 @@ class TextRegions(object):
         if N == 0:  #no valid pixels in mask:
             return  #None
         nsample = min(nsample, N)
-        idx = np.random.choice(N, nsample, replace=False)
-        # generate neighborhood matrix:
-        # (1+4)x2xNsample (2 for y,x)
+        idx = rng.choice(N, nsample, replace=False)
+        # indices of the samples and of their neighbours:
+        # (1+4)xNsample
         xs, ys = xs[idx], ys[idx]
         s = step
-        X = np.transpose(np.c_[xs, xs + s, xs + s, xs - s, xs - s][:, :, None],
-                         (1, 2, 0))
-        Y = np.transpose(np.c_[ys, ys + s, ys - s, ys + s, ys - s][:, :, None],
-                         (1, 2, 0))
-        sample_idx = np.concatenate([Y, X], axis=1)
-        mask_nn_idx = np.zeros((5, sample_idx.shape[-1]), 'int32')
-        for i in range(sample_idx.shape[-1]):
-            mask_nn_idx[:, i] = mask_idx[sample_idx[:, :, i][:, 0],
-                                         sample_idx[:, :, i][:, 1]]
+        X = np.stack([xs, xs + s, xs + s, xs - s, xs - s])
+        Y = np.stack([ys, ys + s, ys - s, ys + s, ys - s])
+        mask_nn_idx = mask_idx[Y, X]
         return mask_nn_idx
 
-    def filter_depth(self, xyz, seg, regions):
+    def filter_depth(self,
+                     xyz,
+                     seg,
+                     regions,
+                     rng=None,
+                     index=None,
+                     scale=1,
+                     planes=None):
+        """
+        Fits a plane to the XYZ (a synth.DepthXYZ) of every region.
+        SCALE  : SEG and XYZ are downsampled by SCALE.
+        PLANES : {label: plane coefficients} fit at a coarser scale; the
+                 planes are then refit to their inliers, without RANSAC.
+        """
+        if index is None:
+            index = LabelIndex(seg)
+        num_inlier = self.num_inlier / scale**2
         plane_info = {
             'label': [],
             'coeff': [],
@@ -109,18 +160,44 @@ class TextRegions(object):
             'rot': [],
             'area': []
         }
-        for idx, l in enumerate(regions['label']):
-            mask = seg == l
-            pt_sample = self.sample_grid_neighbours(mask,
-                                                    self.ransac_fit_trials,
-                                                    step=3)
-            if pt_sample is None:
-                continue  #not enough points for RANSAC
+        def fit_plane(task):
+            idx, l, pt_sample = task
             # get-depths
-            pt = xyz[mask]
-            plane_model = synth.isplanar(pt, pt_sample, self.dist_thresh,
-                                         self.num_inlier,
-                                         self.min_z_projection)
+            pt = xyz.take(index.pixels(l))
+            counts = {}
+            if planes is not None:
+                plane_model = synth.refine_plane(pt, planes[l],
+                                                 self.dist_thresh, num_inlier,
+                                                 self.min_z_projection)
+            else:
+                plane_model = synth.isplanar(pt,
+                                             pt_sample,
+                                             self.dist_thresh,
+                                             num_inlier,
+                                             self.min_z_projection,
+                                             preemptive=self.ransac_options(),
+                                             counts=counts)
+            return plane_model, counts
+
+        # the RANSAC samples are drawn first, in order, so that the planes
+        # do not depend on the no. of threads:
+        tasks = []
+        for idx, l in enumerate(regions['label']):
+            pt_sample = None
+            if planes is None:
+                # the samples index the pixels of the region in raster
+                # order, the same in its bounding box as in the image:
+                mask, _ = index.mask(l, crop=True)
+                pt_sample = self.sample_grid_neighbours(
+                    mask, self.ransac_fit_trials, step=3, rng=rng)
+                if pt_sample is None:
+                    continue  #not enough points for RANSAC
+            tasks.append((idx, l, pt_sample))
+
+        for (idx, l, _), (plane_model, counts) in zip(
+                tasks, self.map_regions(fit_plane, tasks)):
+            for k, n in counts.items():
+                self.ransac_counts[k] = self.ransac_counts.get(k, 0) + n
             if plane_model is not None:
                 plane_coeff = plane_model[0]
                 if np.abs(plane_coeff[2]) > self.min_z_projection:
@@ -132,12 +209,45 @@ class TextRegions(object):
 
         return plane_info
 
-    def get_regions(self, xyz, seg, area, label):
-        regions = self.filter(seg, area, label)
+    def get_regions(self, xyz, seg, area, label, rng=None, index=None):
+        """
+        XYZ : synth.DepthXYZ of the scene
+        RNG : numpy.random.Generator for the RANSAC samples; TEXT_REGIONS
+              is shared, so pass one per call (default: self.rng).
+        INDEX : LabelIndex of SEG (computed if None).
+        """
+        if index is None:
+            index = LabelIndex(seg)
+        if self.coarse_scale > 1:
+            return self.get_regions_coarse(xyz, seg, area, label, rng, index)
+        regions = self.filter(seg, area, label, index)
         # fit plane to text-regions:
-        regions = self.filter_depth(xyz, seg, regions)
+        regions = self.filter_depth(xyz, seg, regions, rng, index)
         return regions
 
+    def get_regions_coarse(self, xyz, seg, area, label, rng, index):
+        """
+        Coarse-to-fine GET_REGIONS: the regions are filtered and their
+        planes fit (RANSAC) on every COARSE_SCALE-th pixel; only the
+        regions which pass are checked at full resolution, where their
+        planes are refit to their inliers.
+        """
+        s = self.coarse_scale
+        seg_c = seg[::s, ::s]
+        index_c = LabelIndex(seg_c)
+        # the regions (and their areas) left after subsampling:
+        label_c = label[np.isin(label, index_c.labels)]
+        area_c = np.array([index_c.count(l) for l in label_c])
+        regions = self.filter(seg_c, area_c, label_c, index_c, scale=s)
+        regions = self.filter_depth(xyz.downsample(s), seg_c, regions, rng,
+                                    index_c, scale=s)
+        planes = dict(zip(regions['label'], regions['coeff']))
+
+        # refine the survivors at full resolution:
+        keep = np.isin(label, regions['label'])
+        regions = self.filter(seg, area[keep], label[keep], index)
+        return self.filter_depth(xyz, seg, regions, index=index, planes=planes)
+
     def filter_rectified(self, mask):
         """
         mask : 1 where 'ON', 0 where 'OFF'
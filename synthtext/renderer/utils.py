@@ -5,6 +5,8 @@ import matplotlib.pyplot as plt
 import cv2
 
 import synthtext.synth as synth
+from synthtext.bbox import get_bounding_rect, get_crops, filter_valid
+from synthtext.timing import timed
 from .text_regions import TEXT_REGIONS
 
 
@@ -37,32 +39,37 @@ def rescale_frontoparallel(p_fp, box_fp, p_im):
     return s
 
 
-def get_text_placement_mask(xyz, mask, plane, pad=2, viz=False):
+@timed('rectify')
+def get_text_placement_mask(xyz, mask, plane, pad=2, viz=False, offset=(0, 0)):
     """
     Returns a binary mask in which text can be placed.
     Also returns a homography from original image
     to this rectified mask.
 
-    XYZ  : (HxWx3) image xyz coordinates
-    MASK : (HxW) : non-zero pixels mark the object mask
+    XYZ  : (HxWx3) image xyz coordinates (or a synth.DepthXYZ)
+    MASK : (hxw) : non-zero pixels mark the object mask; e.g. over the
+           bounding box of the object only
     REGION : DICT output of TEXT_REGIONS.get_regions
     PAD : number of pixels to pad the placement-mask by
+    OFFSET : (row, column) of the top-left pixel of MASK in the image
     """
-    contour, hier = cv2.findContours(mask.copy().astype('uint8'),
+    # contours in image coordinates:
+    contour, hier = cv2.findContours(mask.astype('uint8'),
                                      mode=cv2.RETR_CCOMP,
-                                     method=cv2.CHAIN_APPROX_SIMPLE)
+                                     method=cv2.CHAIN_APPROX_SIMPLE,
+                                     offset=(int(offset[1]), int(offset[0])))
     contour = [np.squeeze(c).astype('float') for c in contour]
     #plane = np.array([plane[1],plane[0],plane[2],plane[3]])
-    H, W = mask.shape[:2]
+    H, W = xyz.shape[:2]
 
     # bring the contour 3d points to fronto-parallel config:
     pts, pts_fp = [], []
     center = np.array([W, H]) / 2
     n_front = np.array([0.0, 0.0, -1.0])
+    R = synth.rot3d(plane[:3].copy(), n_front)
     for i in range(len(contour)):
         cnt_ij = contour[i]
         xyz = synth.DepthCamera.plane2xyz(center, cnt_ij, plane)
-        R = synth.rot3d(plane[:3], n_front)
         xyz = xyz.dot(R.T)
         pts_fp.append(xyz[:, :2])
         pts.append(cnt_ij)
@@ -105,14 +112,12 @@ def get_text_placement_mask(xyz, mask, plane, pad=2, viz=False):
     if not TEXT_REGIONS.filter_rectified((~place_mask).astype('float') / 255):
         return
 
-    # calculate the homography
+    # calculate the homography (and its inverse):
     H, _ = cv2.findHomography(pts[0].astype('float32').copy(),
                               pts_fp_i32[0].astype('float32').copy(),
                               method=0)
-
-    Hinv, _ = cv2.findHomography(pts_fp_i32[0].astype('float32').copy(),
-                                 pts[0].astype('float32').copy(),
-                                 method=0)
+    Hinv = np.linalg.inv(H)
+    Hinv /= Hinv[2, 2]
     if viz:
         plt.subplot(1, 2, 1)
         plt.imshow(mask)
@@ -130,80 +135,32 @@ def get_text_placement_mask(xyz, mask, plane, pad=2, viz=False):
     return place_mask, H, Hinv
 
 
-def get_bounding_rect(min_area_rect):
-    """Get bounding rect of a rotated rect.
-     
-        Args:
-            min_area_rect, np.ndarray, 2x4xN, N is the total of rect
-        Return:
-            four_points, np.ndarray, 2x4xN, [top_left, top_right, bottom_right, bottom_left]
-            extreme_points, [xmin, ymin, xmax, ymax]
-    """
-    xmin = min_area_rect[0].min(axis=0)
-    xmax = min_area_rect[0].max(axis=0)
-    ymin = min_area_rect[1].min(axis=0)
-    ymax = min_area_rect[1].max(axis=0)
-
-    xx = np.concatenate(
-        [xmin[None, :], xmax[None, :], xmax[None, :], xmin[None, :]], axis=0)
-    yy = np.concatenate(
-        [ymin[None, :], ymin[None, :], ymax[None, :], ymax[None, :]], axis=0)
-    four_points = np.concatenate([xx[None, :, :], yy[None, :, :]], axis=0)
-    extreme_points = [xmin, ymin, xmax, ymax]
-    return four_points, extreme_points
-
-
-def get_crops(img, rects):
-    """Get crops from image based on rects.
-
-    Args:
-        img, np.ndarray
-        rects, [xmins, ymins, xmaxs, ymaxs], each entry has a length of N (total of rect), (xmin, ymin) is the top left point of a rect, (xmax, ymax) is the bottom right point of a rect
-            xmins, np.ndarray
-    Return:
-        crops, list of crop, which is a np.ndarray
+class CollisionMasks(object):
     """
-    xmins, ymins, xmaxs, ymaxs = rects
-    assert len(xmins) == len(ymins) == len(xmaxs) == len(ymaxs)
-    crops_total = len(xmins)
-    crops = []
-    valid_flags = []
-    for idx in range(crops_total):
-        xmin = xmins[idx]
-        ymin = ymins[idx]
-        xmax = xmaxs[idx]
-        ymax = ymaxs[idx]
-        crop = get_crop(img, xmin, ymin, xmax, ymax)
-        crops.append(crop)
-        is_valid = crop is not None
-        valid_flags.append(is_valid)
-    return crops, valid_flags
-
-
-def get_crop(img, xmin, ymin, xmax, ymax):
-    """Get crop from img based on a rect.
-
-        Args:
-            xmins, np.ndarray
-            (xmin, ymin) is the top left point of a rect, (xmax, ymax) is the bottom right point of a rect
+    Copy-on-write collision masks of the text regions, for one instance.
+
+    The pristine per-region masks (regions['place_mask']) are shared by
+    all the instances of a scene, as read-only views; a private copy of
+    the mask of a region is made only once text is placed in it.
     """
-    rows, cols = img.shape[:2]
-    # height, width, channel
-    x_start = int(xmin)
-    x_end = int(xmax + 1)
-    y_start = int(ymin)
-    y_end = int(ymax + 1)
-    if x_start >= 0 and y_start >= 0 and \
-            x_end <= cols and y_end <= rows:
-        crop = img[y_start:y_end, x_start:x_end]
-        return crop
-    else:
-        return None
-
-
-def filter_valid(raw_list, valid_flags):
-    valid_list = []
-    for idx, is_valid in enumerate(valid_flags):
-        if is_valid:
-            valid_list.append(raw_list[idx])
-    return valid_list
+    def __init__(self, masks):
+        self.shared = masks
+        self.private = {}
+
+    def __len__(self):
+        return len(self.shared)
+
+    def __getitem__(self, i):
+        if i in self.private:
+            return self.private[i]
+        mask = self.shared[i].view()
+        mask.flags.writeable = False
+        return mask
+
+    def add_text(self, i, text_mask):
+        """
+        Marks the pixels of TEXT_MASK as occupied in region I.
+        """
+        if i not in self.private:
+            self.private[i] = self.shared[i].copy()
+        self.private[i] += (255 * (text_mask > 0)).astype('uint8')
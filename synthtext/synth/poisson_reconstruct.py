@@ -13,6 +13,8 @@ import scipy.ndimage
 import cv2
 import matplotlib.pyplot as plt
 import seaborn as sns
+
+from synthtext.common import NO_DEADLINE
 #sns.set(style="darkgrid")
 
 
@@ -94,10 +96,15 @@ def poisson_solve(gx, gy, bnd):
     return img
 
 
-def blit_images(im_top, im_back, scale_grad=1.0, mode='max'):
+def blit_images(im_top,
+                im_back,
+                scale_grad=1.0,
+                mode='max',
+                deadline=NO_DEADLINE):
     """
     combine images using poission editing.
     IM_TOP and IM_BACK should be of the same size.
+    DEADLINE is checked before solving for every channel.
     """
     assert np.all(im_top.shape == im_back.shape)
 
@@ -107,6 +114,7 @@ def blit_images(im_top, im_back, scale_grad=1.0, mode='max'):
 
     # frac of gradients which come from source:
     for ch in range(im_top.shape[2]):
+        deadline.check('blit_images')
         ims = im_top[:, :, ch]
         imd = im_back[:, :, ch]
 
@@ -139,7 +147,11 @@ def blit_images(im_top, im_back, scale_grad=1.0, mode='max'):
                 m = 'max'
                 if scale_grad > 1:
                     m = 'blend'
-                return blit_images(im_top, im_back, scale_grad=1.5, mode=m)
+                return blit_images(im_top,
+                                   im_back,
+                                   scale_grad=1.5,
+                                   mode=m,
+                                   deadline=deadline)
 
         elif mode == 'src':
             gx, gy = gxd.copy(), gyd.copy()
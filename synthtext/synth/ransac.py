@@ -3,6 +3,8 @@ import numpy as np
 from matplotlib import pylab
 from mpl_toolkits import mplot3d
 
+from synthtext.timing import timed
+
 
 def fit_plane(xyz, z_pos=None):
     """
@@ -24,53 +26,227 @@ def fit_plane(xyz, z_pos=None):
     return abcd
 
 
+# max. no. of point-to-plane distances computed at once
+# (hypotheses x points), to bound the memory of batched scoring:
+MAX_BATCH = 2**21
+
+
+def planes_from_moments(mean, cov, z_pos=None):
+    """
+    Batched FIT_PLANE from the first and second moments of K point sets.
+
+    mean : Kx3 centroids
+    cov  : Kx3x3 scatter matrices (about the centroids)
+
+    Returns Kx4 unit-normal plane coefficients.
+    """
+    # eigenvalues in ascending order: the normal is the first eigenvector
+    _, v = np.linalg.eigh(cov)
+    abc = v[:, :, 0]
+    d = -np.sum(abc * mean, axis=1)
+    abcd = np.c_[abc, d] / np.linalg.norm(abc, axis=1)[:, None]
+    if z_pos is not None:
+        flip = np.sum(abcd[:, :3] * z_pos[None, :], axis=1) < 0.0
+        abcd[flip] *= -1
+    return abcd
+
+
+def fit_planes(xyz, z_pos=None):
+    """
+    Batched FIT_PLANE : fits a plane to each of K point sets.
+    xyz : Kxnx3 points
+    """
+    xyz = xyz.astype('float64')
+    mean = np.mean(xyz, axis=1)
+    xyz_c = xyz - mean[:, None, :]
+    cov = np.einsum('kni,knj->kij', xyz_c, xyz_c)
+    return planes_from_moments(mean, cov, z_pos)
+
+
+def fit_planes_masked(pts, masks, z_pos=None):
+    """
+    Fits a plane to each of the K subsets of PTS (nx3) given by the
+    rows of MASKS (Kxn boolean).
+    """
+    # center first, to keep the moments well-conditioned:
+    mu = np.mean(pts, axis=0, dtype='float64')
+    pts_c = pts - mu[None, :]
+    outer = (pts_c[:, :, None] * pts_c[:, None, :]).reshape(-1, 9)
+    w = masks.astype('float64')
+    n = np.sum(w, axis=1)
+    mean = w.dot(pts_c) / n[:, None]
+    cov = (w.dot(outer).reshape(-1, 3, 3) -
+           n[:, None, None] * mean[:, :, None] * mean[:, None, :])
+    return planes_from_moments(mean + mu[None, :], cov, z_pos)
+
+
+def homogeneous(pts):
+    """
+    nx4 homogeneous coordinates of PTS (nx3), in single precision:
+    ample for distances of a few cm, at half the memory traffic.
+    """
+    return np.c_[pts, np.ones(len(pts))].astype('float32')
+
+
+def plane_inliers(pts_h, models, dist_inlier):
+    """
+    Kxn : whether each of the points PTS_H (nx4, homogeneous) is within
+    DIST_INLIER of each of the planes MODELS (Kx4).
+    """
+    d = models.astype('float32').dot(pts_h.T)
+    return np.abs(d, out=d) < dist_inlier
+
+
+def count_inliers(pts_h, models, dist_inlier):
+    """
+    No. of points of PTS_H (nx4, homogeneous) within DIST_INLIER of
+    each of the planes MODELS (Kx4), scored in batches of hypotheses.
+    """
+    n = pts_h.shape[0]
+    step = max(1, MAX_BATCH // max(n, 1))
+    nin = np.zeros(len(models), 'int64')
+    for i in range(0, len(models), step):
+        inlier = plane_inliers(pts_h, models[i:i + step], dist_inlier)
+        nin[i:i + step] = np.count_nonzero(inlier, axis=1)
+    return nin
+
+
+def preemptive_search(pts,
+                      pts_h,
+                      idx,
+                      z_pos,
+                      dist_inlier,
+                      min_inlier_frac,
+                      subset=256,
+                      block=10,
+                      confidence=0.99,
+                      nrefit=10,
+                      z=3.0):
+    """
+    Preemptive RANSAC: the hypotheses fit to the samples IDX (Kxs
+    indices into PTS) are taken in blocks of BLOCK. Each one is scored
+    first on a systematic SUBSET of the points; it is scored on all the
+    points only if it can still pass MIN_INLIER_FRAC and make it to the
+    NREFIT best so far (its subset inlier fraction + Z standard errors).
+    The search stops once enough hypotheses were drawn to have sampled
+    an all-inlier set with probability CONFIDENCE, given the best
+    inlier fraction so far (the standard adaptive bound).
+
+    Returns (models, ninlier, niter, nscored): the hypotheses scored on
+    all the points and their inlier counts, the no. of hypotheses drawn
+    and the no. scored on all the points.
+    """
+    n = pts.shape[0]
+    nsample = idx.shape[1]
+    # points are in raster order: a strided subset covers the region
+    sub = pts_h[::max(1, n // subset)]
+    models, ninlier = [], []
+    niter, nscored = 0, 0
+    best = np.zeros(0, 'int64')  # the NREFIT best inlier counts so far
+    for i in range(0, len(idx), block):
+        m = fit_planes(pts[idx[i:i + block], :], z_pos)
+        niter += len(m)
+        frac = count_inliers(sub, m, dist_inlier) / len(sub)
+        upper = frac + z * np.sqrt(frac * (1 - frac) / len(sub))
+        bar = min_inlier_frac
+        if len(best) == nrefit:
+            bar = max(bar, best[-1] / n)
+        m = m[upper >= bar]
+        nin = count_inliers(pts_h, m, dist_inlier)
+        nscored += len(m)
+        models.append(m)
+        ninlier.append(nin)
+        nin = nin[nin / n >= min_inlier_frac]
+        best = -np.sort(-np.r_[best, nin])[:nrefit]
+        # adaptive stopping:
+        if len(best) > 0:
+            p_good = (best[0] / n)**nsample
+            if p_good >= 1:
+                break
+            need = np.log(1 - confidence) / np.log(1 - p_good)
+            if niter >= need:
+                break
+    return np.concatenate(models), np.concatenate(ninlier), niter, nscored
+
+
+@timed('ransac')
 def fit_plane_ransac(pts,
                      neighbors=None,
                      z_pos=None,
                      dist_inlier=0.05,
                      min_inlier_frac=0.60,
                      nsample=3,
-                     max_iter=100):
+                     max_iter=100,
+                     rng=np.random,
+                     preemptive=None,
+                     counts=None):
     """
     Fits a 3D plane model using RANSAC. 
     pts : (nx3 array) of point coordinates   
+    rng : random generator for the samples (if NEIGHBORS is None)
+    preemptive : None to score every hypothesis on every point, or the
+                 keyword arguments of PREEMPTIVE_SEARCH (a dict).
+    counts : dict in which to add up the no. of hypotheses drawn and
+             scored on all the points ('iterations', 'full_scores'),
+             and how many fewer than MAX_ITER that is ('*_saved').
+
+    All the hypotheses are fit at once and scored with one matrix
+    product (in batches), and the best ones are refit together.
     """
     n, _ = pts.shape
-    ninlier, models = [], []
-    for i in range(max_iter):
-        if neighbors is None:
-            p = pts[np.random.choice(pts.shape[0], nsample, replace=False), :]
-        else:
-            p = pts[neighbors[:, i], :]
-        m = fit_plane(p, z_pos)
-        ds = np.abs(pts.dot(m[:3]) + m[3])
-        nin = np.sum(ds < dist_inlier)
-        if nin / pts.shape[0] >= min_inlier_frac:
-            ninlier.append(nin)
-            models.append(m)
-
-    if models == []:
+    if neighbors is None:
+        idx = np.stack([
+            rng.choice(pts.shape[0], nsample, replace=False)
+            for i in range(max_iter)
+        ])
+    else:
+        idx = neighbors[:, :max_iter].T
+    pts_h = homogeneous(pts)
+    if preemptive is None:
+        models = fit_planes(pts[idx, :], z_pos)
+        ninlier = count_inliers(pts_h, models, dist_inlier)
+        niter, nscored = len(idx), len(idx)
+    else:
+        models, ninlier, niter, nscored = preemptive_search(
+            pts, pts_h, idx, z_pos, dist_inlier, min_inlier_frac,
+            **preemptive)
+    if counts is not None:
+        for k, v in [('fits', 1), ('iterations', niter),
+                     ('iterations_saved', len(idx) - niter),
+                     ('full_scores', nscored),
+                     ('full_scores_saved', len(idx) - nscored)]:
+            counts[k] = counts.get(k, 0) + v
+    good = ninlier / pts.shape[0] >= min_inlier_frac
+    ninlier, models = ninlier[good], models[good]
+
+    if len(models) == 0:
         print("RANSAC plane fitting failed!")
         return  #None
     else:  #refit the model to inliers:
-        ninlier = np.array(ninlier)
         best_model_idx = np.argsort(-ninlier)
-        n_refit, m_refit, inliers = [], [], []
-        for idx in best_model_idx[:min(10, len(best_model_idx))]:
-            # re-estimate the model based on inliers:
-            dists = np.abs(pts.dot(models[idx][:3]) + models[idx][3])
-            inlier = dists < dist_inlier
-            m = fit_plane(pts[inlier, :], z_pos)
-            # compute new inliers:
-            d = np.abs(pts.dot(m[:3]) + m[3])
-            inlier = d < dist_inlier / 2  # heuristic
-            n_refit.append(np.sum(inlier))
-            m_refit.append(m)
-            inliers.append(inlier)
-        best_plane = np.argmax(n_refit)
+        best = models[best_model_idx[:min(10, len(best_model_idx))]]
+        # re-estimate the models based on their inliers:
+        inlier = plane_inliers(pts_h, best, dist_inlier)
+        m_refit = fit_planes_masked(pts, inlier, z_pos)
+        # compute new inliers:
+        inliers = plane_inliers(pts_h, m_refit, dist_inlier / 2)  # heuristic
+        best_plane = np.argmax(np.count_nonzero(inliers, axis=1))
         return m_refit[best_plane], inliers[best_plane]
 
 
+def report_counts(counts):
+    """
+    One line summary of the COUNTS of fit_plane_ransac.
+    """
+    nfit = counts['fits']
+    ndrawn = counts['iterations'] + counts['iterations_saved']
+    return ('RANSAC: %d fits, %.1f hypotheses drawn and %.1f scored on all '
+            'the points per fit (%.0f%% and %.0f%% saved)' %
+            (nfit, counts['iterations'] / nfit, counts['full_scores'] / nfit,
+             100.0 * counts['iterations_saved'] / max(ndrawn, 1),
+             100.0 * counts['full_scores_saved'] / max(ndrawn, 1)))
+
+
 if __name__ == '__main__':
     fig = pylab.figure()
     ax = mplot3d.Axes3D(fig)
@@ -5,6 +5,7 @@ import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 
 from .ransac import fit_plane_ransac
+from .ransac import fit_planes_masked, homogeneous, plane_inliers
 #import mayavi.mlab as mym
 
 
@@ -220,7 +221,13 @@ def ensure_proj_z(plane_coeffs, min_z_proj):
     return plane_coeffs
 
 
-def isplanar(xyz, sample_neighbors, dist_thresh, num_inliers, z_proj):
+def isplanar(xyz,
+             sample_neighbors,
+             dist_thresh,
+             num_inliers,
+             z_proj,
+             preemptive=None,
+             counts=None):
     """
     Checks if at-least FRAC_INLIERS fraction of points of XYZ (nx3)
     points lie on a plane. The plane is fit using RANSAC.
@@ -233,6 +240,7 @@ def isplanar(xyz, sample_neighbors, dist_thresh, num_inliers, z_proj):
     FRAC_INLIERS : fraction of total-points which should be inliers to
                    to declare that points are planar.
     Z_PROJ : changes the surface normal, so that its projection on z axis is ATLEAST z_proj.
+    PREEMPTIVE, COUNTS : see fit_plane_ransac.
 
     Returns:
         None, if the data is not planar, else a 4-tuple of plane coeffs.
@@ -247,7 +255,9 @@ def isplanar(xyz, sample_neighbors, dist_thresh, num_inliers, z_proj):
                                   dist_inlier=dist_thresh,
                                   min_inlier_frac=frac_inliers,
                                   nsample=20,
-                                  max_iter=max_iter)
+                                  max_iter=max_iter,
+                                  preemptive=preemptive,
+                                  counts=counts)
     if plane_info != None:
         coeff, inliers = plane_info
         coeff = ensure_proj_z(coeff, z_proj)
@@ -256,6 +266,22 @@ def isplanar(xyz, sample_neighbors, dist_thresh, num_inliers, z_proj):
         return  #None
 
 
+def refine_plane(xyz, coeff, dist_thresh, num_inliers, z_proj):
+    """
+    Refits the plane COEFF (e.g. fit by ISPLANAR to a subsampling of
+    XYZ) to its inliers among the points XYZ (nx3), instead of running
+    RANSAC again; the other arguments and the output are as ISPLANAR.
+    """
+    dv = -np.percentile(xyz, 50, axis=0)
+    pts_h = homogeneous(xyz)
+    inlier = plane_inliers(pts_h, np.atleast_2d(coeff), dist_thresh)
+    if np.count_nonzero(inlier) < max(num_inliers, 3):
+        return  #None
+    coeff = fit_planes_masked(xyz, inlier, dv)
+    inliers = plane_inliers(pts_h, coeff, dist_thresh / 2)[0]
+    coeff = ensure_proj_z(coeff[0], z_proj)
+    return coeff, inliers
+
 class DepthCamera(object):
     """
     Camera functions for Depth-CNN camera.
@@ -305,3 +331,50 @@ class DepthCamera(object):
         depth /= np.max(depth)
         depth = (255 * depth).astype('uint8')
         return np.dstack([rgb[:, :, 0], depth, rgb[:, :, 1]])
+
+
+class DepthXYZ(object):
+    """
+    Lazy XYZ of a HxW depth image (float, in meters): the pixels are
+    back-projected with the camera constant DepthCamera.f only when
+    asked for, in float32, instead of building the HxWx3 array of
+    DepthCamera.depth2xyz.
+
+    STEP, SIZE : DEPTH is every STEP-th pixel of a depth image of
+                 SIZE = (H, W) (see downsample).
+    """
+    def __init__(self, depth, step=1, size=None):
+        self.depth = depth
+        self.step = step
+        self.size = depth.shape[:2] if size is None else size
+        H, W = depth.shape[:2]
+        self.shape = (H, W, 3)
+
+    def downsample(self, step):
+        """
+        XYZ of every STEP-th pixel (in both directions).
+        """
+        return DepthXYZ(self.depth[::step, ::step], self.step * step,
+                        self.size)
+
+    def take(self, idx):
+        """
+        nx3 float32 XYZ of the pixels with the flat indices IDX,
+        as DepthCamera.depth2xyz(depth).reshape(-1, 3)[idx].
+        """
+        yy, xx = np.divmod(np.asarray(idx), self.shape[1])
+        z = self.depth[yy, xx].astype('float32')
+        H, W = self.size
+        f = np.float32(DepthCamera.f)
+        xyz = np.empty((len(z), 3), 'float32')
+        xyz[:, 0] = (self.step * xx - W / 2).astype('float32') * z / f
+        xyz[:, 1] = (self.step * yy - H / 2).astype('float32') * z / f
+        xyz[:, 2] = z
+        return xyz
+
+    def array(self):
+        """
+        The full HxWx3 XYZ (e.g. for visualization).
+        """
+        return self.take(np.arange(self.shape[0] * self.shape[1])).reshape(
+            self.shape)
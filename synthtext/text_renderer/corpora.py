@@ -2,6 +2,7 @@ import numpy as np
 import scipy.stats as sstat
 import os.path as osp
 
+from synthtext.common import NO_DEADLINE
 from synthtext.config import load_cfg
 
 from .utils import sample_weighted
@@ -11,11 +12,13 @@ class Corpora(object):
     """
     Provides text for words, paragraphs, sentences.
     """
-    def __init__(self):
+    def __init__(self, rng=None):
         """
         TXT_FP : path to file containing text data.
+        RNG    : numpy.random.Generator to draw from.
         """
         load_cfg(self)
+        self.set_rng(rng)
         #fp = osp.join(self.data_dir, 'newsgroup/newsgroup.txt')
         #fp = osp.join(self.data_dir, 'newsgroup/alpha_words.txt')
         self.fdict = {
@@ -27,6 +30,9 @@ class Corpora(object):
         with open(self.corpora_fp, 'r') as f:
             self.txt = [l.strip() for l in f.readlines()]
 
+    def set_rng(self, rng=None):
+        self.rng = np.random.default_rng() if rng is None else rng
+
     def check_symb_frac(self, txt, f=0.35):
         """
         T/F return : T iff fraction of symbol/special-charcters in
@@ -67,19 +73,27 @@ class Corpora(object):
             lines[i] = ' ' * lspace + l + ' ' * rspace
         return lines
 
-    def get_lines(self, nline, nword, nchar_max, f=0.35, niter=100):
+    def get_lines(self,
+                  nline,
+                  nword,
+                  nchar_max,
+                  f=0.35,
+                  niter=100,
+                  deadline=NO_DEADLINE):
         def h_lines(niter=100):
             lines = ['']
             iter_ = 0
             while not np.all(self.is_good(lines, f)) and iter_ < niter:
+                deadline.check('corpora')
                 iter_ += 1
-                line_start = np.random.choice(len(self.txt) - nline)
+                line_start = self.rng.choice(len(self.txt) - nline)
                 lines = [self.txt[line_start + i] for i in range(nline)]
             return lines
 
         lines = ['']
         iter_ = 0
         while not np.all(self.is_good(lines, f)) and iter_ < niter:
+            deadline.check('corpora')
             iter_ += 1
             lines = h_lines(niter=100)
             # get words per line:
@@ -88,7 +102,7 @@ class Corpora(object):
                 words = lines[i].split()
                 dw = len(words) - nword[i]
                 if dw > 0:
-                    first_word_index = np.random.choice(range(dw + 1))
+                    first_word_index = self.rng.choice(range(dw + 1))
                     lines[i] = ' '.join(
                         words[first_word_index:first_word_index + nword[i]])
 
@@ -106,24 +120,31 @@ class Corpora(object):
             return lines
 
     # main method
-    def sample_text(self, nline_max, nchar_max):
-
+    def sample_text(self, nline_max, nchar_max, deadline=NO_DEADLINE):
+        """
+        DEADLINE is checked in every iteration of the rejection loops.
+        """
         # sample text:
-        text_type = sample_weighted(self.p_text)
-        text = self.fdict[text_type](nline_max, nchar_max)
+        text_type = sample_weighted(self.p_text, self.rng)
+        text = self.fdict[text_type](nline_max, nchar_max, deadline=deadline)
         return text
 
-    def sample_word(self, nline_max, nchar_max, niter=100):
-        rand_line = self.txt[np.random.choice(len(self.txt))]
+    def sample_word(self,
+                    nline_max,
+                    nchar_max,
+                    niter=100,
+                    deadline=NO_DEADLINE):
+        rand_line = self.txt[self.rng.choice(len(self.txt))]
         words = rand_line.split()
-        rand_word = np.random.choice(words)
+        rand_word = self.rng.choice(words)
 
         iter_ = 0
         while iter_ < niter and (not self.is_good([rand_word])[0]
                                  or len(rand_word) > nchar_max):
-            rand_line = self.txt[np.random.choice(len(self.txt))]
+            deadline.check('corpora')
+            rand_line = self.txt[self.rng.choice(len(self.txt))]
             words = rand_line.split()
-            rand_word = np.random.choice(words)
+            rand_word = self.rng.choice(words)
             iter_ += 1
 
         if not self.is_good([rand_word])[0] or len(rand_word) > nchar_max:
@@ -131,43 +152,56 @@ class Corpora(object):
         else:
             return rand_word
 
-    def sample_line(self, nline_max, nchar_max):
+    def sample_line(self, nline_max, nchar_max, deadline=NO_DEADLINE):
         nline = nline_max + 1
         while nline > nline_max:
-            nline = np.random.choice([1, 2, 3], p=self.p_line_nline)
+            nline = self.rng.choice([1, 2, 3], p=self.p_line_nline)
 
         # get number of words:
         nword = [
             self.p_line_nword[2] *
-            sstat.beta.rvs(a=self.p_line_nword[0], b=self.p_line_nword[1])
+            sstat.beta.rvs(a=self.p_line_nword[0],
+                           b=self.p_line_nword[1],
+                           random_state=self.rng)
             for _ in range(nline)
         ]
         nword = [max(1, int(np.ceil(n))) for n in nword]
 
-        lines = self.get_lines(nline, nword, nchar_max, f=0.35)
+        lines = self.get_lines(nline,
+                               nword,
+                               nchar_max,
+                               f=0.35,
+                               deadline=deadline)
         if lines is not None:
             return '\n'.join(lines)
         else:
             return []
 
-    def sample_para(self, nline_max, nchar_max):
+    def sample_para(self, nline_max, nchar_max, deadline=NO_DEADLINE):
         # get number of lines in the paragraph:
         nline = nline_max * sstat.beta.rvs(a=self.p_para_nline[0],
-                                           b=self.p_para_nline[1])
+                                           b=self.p_para_nline[1],
+                                           random_state=self.rng)
         nline = max(1, int(np.ceil(nline)))
 
         # get number of words:
         nword = [
             self.p_para_nword[2] *
-            sstat.beta.rvs(a=self.p_para_nword[0], b=self.p_para_nword[1])
+            sstat.beta.rvs(a=self.p_para_nword[0],
+                           b=self.p_para_nword[1],
+                           random_state=self.rng)
             for _ in range(nline)
         ]
         nword = [max(1, int(np.ceil(n))) for n in nword]
 
-        lines = self.get_lines(nline, nword, nchar_max, f=0.35)
+        lines = self.get_lines(nline,
+                               nword,
+                               nchar_max,
+                               f=0.35,
+                               deadline=deadline)
         if lines is not None:
             # center align the paragraph-text:
-            if np.random.rand() < self.center_para:
+            if self.rng.random() < self.center_para:
                 lines = self.center_align(lines)
             return '\n'.join(lines)
         else:
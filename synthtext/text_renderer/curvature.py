@@ -8,18 +8,25 @@ class Curvature(object):
     curve = lambda this, a: lambda x: a * x * x
     differential = lambda this, a: lambda x: 2 * a * x
 
-    def __init__(self):
+    def __init__(self, rng=None):
         load_cfg(self)
+        self.set_rng(rng)
+
+    def set_rng(self, rng=None):
+        """
+        RNG : numpy.random.Generator to draw from (None: a fresh one).
+        """
+        self.rng = np.random.default_rng() if rng is None else rng
 
     def sample_curvature(self):
         """
         Returns the functions for the curve and differential for a and b
         """
         sgn = 1.0
-        if np.random.rand() < self.p_sgn:
+        if self.rng.random() < self.p_sgn:
             sgn = -1
 
-        a = self.a[1] * np.random.randn() + sgn * self.a[0]
+        a = self.a[1] * self.rng.standard_normal() + sgn * self.a[0]
         return {
             'curve': self.curve(a),
             'diff': self.differential(a),
@@ -11,7 +11,10 @@ import pygame
 import pygame.locals
 import cv2
 
+from synthtext.bbox import xywh2coords
+from synthtext.common import NO_DEADLINE
 from synthtext.config import load_cfg
+from synthtext.timing import timed
 
 from .text_state import TextState
 from .curvature import Curvature
@@ -26,7 +29,7 @@ class TextRenderer(object):
         Output is a binary mask matrix cropped closesly with the font.
         Also, outputs ground-truth bounding boxes and text string
     """
-    def __init__(self):
+    def __init__(self, rng=None):
         # distribution over the type of text:
         load_cfg(self)
 
@@ -38,8 +41,22 @@ class TextRenderer(object):
         # get font-state object:
         self.text_state = TextState()
 
+        self.set_rng(rng)
         pygame.init()
 
+        # flat buffer of the canvases of PLACE_TEXT (grown as needed):
+        self._canvas = np.zeros(0, 'uint8')
+
+    def set_rng(self, rng=None):
+        """
+        RNG : numpy.random.Generator to draw from (None: a fresh one),
+              shared with the curvature, corpora and font state.
+        """
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.curvature.set_rng(self.rng)
+        self.corpora.set_rng(self.rng)
+        self.text_state.set_rng(self.rng)
+
     def render_multiline(self, font, text):
         """
         renders multiline TEXT on the pygame surface SURF with the
@@ -105,7 +122,7 @@ class TextRenderer(object):
         isword = len(word_text.split()) == 1
 
         # do curved iff, the length of the word <= 10
-        rand_num = np.random.rand()
+        rand_num = self.rng.random()
         if not isword or wl > 10 or rand_num > self.p_curved:
             #print('no curve')
             return self.render_multiline(font, word_text)
@@ -210,13 +227,28 @@ class TextRenderer(object):
         nchar = int(np.floor(W / font_width))
         return nline, nchar
 
-    def place_text(self, text_arrs, back_arr, bbs):
+    def get_canvas(self, shape, dtype):
+        """
+        A zeroed (contiguous) array of SHAPE and DTYPE, in a buffer shared
+        by all the calls: it is only valid until the next call.
+        """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if nbytes > self._canvas.size:
+            self._canvas = np.zeros(nbytes, 'uint8')
+        canvas = self._canvas[:nbytes].view(dtype).reshape(shape)
+        canvas.fill(0)
+        return canvas
+
+    @timed('text_layout')
+    def place_text(self, text_arrs, back_arr, bbs, deadline=NO_DEADLINE):
         areas = [-np.prod(ta.shape) for ta in text_arrs]
         order = np.argsort(areas)
 
         locs = [None for i in range(len(text_arrs))]
-        out_arr = np.zeros_like(back_arr)
+        out_arr = self.get_canvas(back_arr.shape, back_arr.dtype)
         for i in order:
+            deadline.check('render_text')
             ba = np.clip(back_arr.copy().astype(np.float), 0, 255)
             ta = np.clip(text_arrs[i].copy().astype(np.float), 0, 255)
             ba[ba > 127] = 1e8
@@ -228,7 +260,7 @@ class TextRenderer(object):
                 return back_arr, locs[:i], bbs[:i], order[:i]
 
             minloc = np.transpose(np.nonzero(safemask))
-            rand_num = np.random.choice(minloc.shape[0])
+            rand_num = self.rng.choice(minloc.shape[0])
             loc = minloc[rand_num, :]
             locs[i] = loc
 
@@ -249,10 +281,10 @@ class TextRenderer(object):
         return rH, rW
 
     def sample_font_height_px(self, h_min, h_max):
-        if np.random.rand() < self.p_flat:
-            rnd = np.random.rand()
+        if self.rng.random() < self.p_flat:
+            rnd = self.rng.random()
         else:
-            rnd = np.random.beta(2.0, 2.0)
+            rnd = self.rng.beta(2.0, 2.0)
         rnd = rnd
 
         h_range = h_max - h_min
@@ -264,21 +296,17 @@ class TextRenderer(object):
         Takes an nx4 bounding-box matrix specified in x,y,w,h
         format and outputs a 2x4xn bb-matrix, (4 vertices per bb).
         """
-        n, _ = bbs.shape
-        coords = np.zeros((2, 4, n))
-        for i in range(n):
-            coords[:, :, i] = bbs[i, :2][:, None]
-            coords[0, 1, i] += bbs[i, 2]
-            coords[:, 2, i] += bbs[i, 2:4]
-            coords[1, 3, i] += bbs[i, 3]
-        return coords
+        return xywh2coords(bbs)
 
     # main method
-    def render_text(self, mask):
+    def render_text(self, mask, deadline=NO_DEADLINE):
         """
         Places text in the "collision-free" region as indicated
         in the mask -- 255 for unsafe, 0 for safe.
         The text is rendered using FONT, the text content is TEXT.
+        DEADLINE is checked in every shrinkage trial, and raises
+        TimeoutException once exceeded.
+        The text mask returned is overwritten by the next call.
         """
         font = self.text_state.sample_font_state()
         #H,W = mask.shape
@@ -295,6 +323,7 @@ class TextRenderer(object):
         ## TODO : change this to allow multiple text instances?
         i = 0
         while i < self.max_shrink_trials and max_font_h > self.min_font_h:
+            deadline.check('render_text')
             # if i > 0:
             #     print colorize(Color.BLUE, "shrinkage trial : %d"%i, True)
 
@@ -316,7 +345,7 @@ class TextRenderer(object):
 
             assert nline >= 1 and nchar >= self.min_nchar
 
-            text = self.corpora.sample_text(nline, nchar)
+            text = self.corpora.sample_text(nline, nchar, deadline)
             #print(text)
             if len(text) == 0 or np.any([len(line) == 0 for line in text]):
                 continue
@@ -332,7 +361,8 @@ class TextRenderer(object):
                 continue
 
             # position the text within the mask:
-            text_mask, loc, bb, _ = self.place_text([txt_arr], mask, [bb])
+            text_mask, loc, bb, _ = self.place_text([txt_arr], mask, [bb],
+                                                    deadline)
             if len(loc) > 0:  #successful in placing the text collision-free:
                 return text_mask, loc[0], bb[0], text, curve_flag
         return  #None
@@ -1,6 +1,7 @@
 import os
 import os.path as osp
 import pickle
+from collections import OrderedDict
 import numpy as np
 
 from pygame import freetype
@@ -12,8 +13,14 @@ class TextState(object):
     """
     Defines the random state of the font rendering  
     """
-    def __init__(self):
+    def __init__(self, rng=None):
         load_cfg(self)
+        self.set_rng(rng)
+
+        # parsed fonts, least recently used first (font path -> Font);
+        # there is one TextState per (worker) process:
+        self.font_cache = OrderedDict()
+        self.font_cache_stats = {'hits': 0, 'misses': 0}
 
         # get character-frequencies in the English language:
         with open(self.char_freq_fp, 'rb') as fd:
@@ -30,12 +37,39 @@ class TextState(object):
                 font_fp = osp.join(self.data_dir, line.strip())
                 self.fonts.append(font_fp)
 
+    def set_rng(self, rng=None):
+        """
+        RNG : numpy.random.Generator to draw from (None: a fresh one).
+        """
+        self.rng = np.random.default_rng() if rng is None else rng
+
+    def get_font(self, font_fp):
+        """
+        The pygame font of the file FONT_FP, from the cache of the
+        FONT_CACHE_SIZE most recently used fonts (0: no cache).
+        """
+        if font_fp in self.font_cache:
+            self.font_cache_stats['hits'] += 1
+            self.font_cache.move_to_end(font_fp)
+            return self.font_cache[font_fp]
+        self.font_cache_stats['misses'] += 1
+        font = freetype.Font(font_fp)
+        if self.font_cache_size > 0:
+            self.font_cache[font_fp] = font
+            if len(self.font_cache) > self.font_cache_size:
+                self.font_cache.popitem(last=False)
+        return font
+
     def init_font(self, fs):
         """
         Initializes a pygame font.
         FS : font-state sample
+
+        The font is shared with the later calls for the same font file:
+        all the attributes set here are set again on every call.
         """
-        font = freetype.Font(fs['font'], size=fs['size'])
+        font = self.get_font(fs['font'])
+        font.size = fs['size']
         font.underline = fs['underline']
         font.underline_adjustment = fs['underline_adjustment']
         font.strong = fs['strong']
@@ -52,37 +86,37 @@ class TextState(object):
         """
         font_state = dict()
 
-        idx = int(np.random.randint(0, len(self.fonts)))
+        idx = int(self.rng.integers(0, len(self.fonts)))
         font_state['font'] = self.fonts[idx]
 
         #idx = int(np.random.randint(0, len(self.capsmode)))
         #font_state['capsmode'] = self.capsmode[idx]
 
-        std = np.random.randn()
+        std = self.rng.standard_normal()
         font_state['size'] = self.size[1] * std + self.size[0]
 
-        std = np.random.randn()
+        std = self.rng.standard_normal()
         font_state['underline_adjustment'] = max(
             2.0,
             min(
                 -2.0, self.underline_adjustment[1] * std +
                 self.underline_adjustment[0]))
 
-        std = np.random.rand()
+        std = self.rng.random()
         font_state['strength'] = (self.strength[1] - self.strength[0]) * std + \
                 self.strength[0]
 
-        std = np.random.beta(self.kerning[0], self.kerning[1])
+        std = self.rng.beta(self.kerning[0], self.kerning[1])
         font_state['char_spacing'] = int(self.kerning[3] * std +
                                          self.kerning[2])
 
-        flag = np.random.rand() < self.underline
+        flag = self.rng.random() < self.underline
         font_state['underline'] = flag
 
-        flag = np.random.rand() < self.strong
+        flag = self.rng.random() < self.strong
         font_state['strong'] = flag
 
-        flag = np.random.rand() < self.oblique
+        flag = self.rng.random() < self.oblique
         font_state['oblique'] = flag
 
         #flag = np.random.rand() < self.border
@@ -1,9 +1,9 @@
 import numpy as np
 
 
-def sample_weighted(p_dict):
+def sample_weighted(p_dict, rng=np.random):
     ps = list(p_dict.keys())
-    key = np.random.choice(ps)
+    key = rng.choice(ps)
     return p_dict[key]
 
 
@@ -36,9 +36,7 @@ def crop_safe(arr, rect, bbs=[], pad=0):
     ]
     arr = arr[v0[0]:v1[0], v0[1]:v1[1], ...]
     if len(bbs) > 0:
-        for i in range(len(bbs)):
-            bbs[i, 0] -= v0[0]
-            bbs[i, 1] -= v0[1]
+        bbs[:, :2] -= np.array(v0, dtype=bbs.dtype)
         return arr, bbs
     else:
         return arr
@@ -0,0 +1,217 @@
+"""
+Per-stage timing of the rendering pipeline.
+
+The expensive stages are wrapped in named spans, either as a decorator:
+
+    @timed('ransac')
+    def fit_plane_ransac(...):
+
+or around a block:
+
+    with span('warp'):
+        ...
+
+Spans are aggregated into a log-spaced histogram of durations per stage
+and, if a trace directory is set, written as Chrome-trace events
+(chrome://tracing, Perfetto) to one file per process.
+
+Timing is off by default; switch it on in the config (CFG.Timing) or
+with the environment variables SYNTHTEXT_TIMING=1 and
+SYNTHTEXT_TRACE_DIR=<dir>. When off, a span costs one attribute lookup.
+"""
+import os
+import os.path as osp
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+import numpy as np
+
+from synthtext.config import CFG
+
+# histogram bin edges (s): 10us .. 100s, 10 bins per decade
+BINS = np.logspace(-5, 2, 71)
+
+
+class StageTimer(object):
+    """
+    Per-process timing state; use the module functions below.
+
+    HIST  : stage -> counts of the durations in BINS
+            (with an under- and an overflow bin)
+    TOTAL : stage -> total duration (s)
+    """
+    def __init__(self):
+        self.enabled = False
+        self.trace_dir = None
+        self.lock = threading.Lock()
+        self.reset()
+        self._trace = None
+        self._pid = None
+        self.configure()
+
+    def configure(self, enabled=None, trace_dir=None):
+        """
+        Defaults to CFG.Timing, overridden by the environment.
+        """
+        cfg = getattr(CFG, 'Timing', {})
+        if enabled is None:
+            enabled = os.environ.get('SYNTHTEXT_TIMING',
+                                     str(int(cfg.get('enabled', False))))
+            enabled = enabled.lower() not in ('', '0', 'false', 'no')
+        if trace_dir is None:
+            trace_dir = os.environ.get('SYNTHTEXT_TRACE_DIR',
+                                       cfg.get('trace_dir'))
+        self.enabled = enabled or trace_dir is not None
+        self.trace_dir = trace_dir
+
+    def reset(self):
+        with self.lock:
+            self.hist = {}
+            self.total = {}
+            self.events = []
+
+    def add(self, stage, t0, t1):
+        dt = t1 - t0
+        with self.lock:
+            if stage not in self.hist:
+                self.hist[stage] = np.zeros(len(BINS) + 1, 'int64')
+                self.total[stage] = 0.0
+            self.hist[stage][np.searchsorted(BINS, dt)] += 1
+            self.total[stage] += dt
+            if self.trace_dir is not None:
+                self.events.append({
+                    'name': stage,
+                    'ph': 'X',
+                    'ts': t0 * 1e6,
+                    'dur': dt * 1e6,
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                })
+
+    def flush_trace(self):
+        """
+        Appends the buffered trace events to TRACE_DIR/trace-PID.json,
+        in the JSON array format (the closing bracket is optional, so the
+        file stays valid if the process is killed).
+        """
+        if self.trace_dir is None:
+            return
+        with self.lock:
+            events, self.events = self.events, []
+        if self._trace is None or self._pid != os.getpid():
+            if not osp.exists(self.trace_dir):
+                os.makedirs(self.trace_dir, exist_ok=True)
+            self._pid = os.getpid()
+            fp = osp.join(self.trace_dir, 'trace-%d.json' % self._pid)
+            self._trace = open(fp, 'w')
+            self._trace.write('[\n')
+        for ev in events:
+            self._trace.write(json.dumps(ev) + ',\n')
+        self._trace.flush()
+
+    def stats(self):
+        """
+        Returns {stage: (hist, total)}, e.g. to ship to another process.
+        """
+        with self.lock:
+            return {
+                stage: (self.hist[stage].copy(), self.total[stage])
+                for stage in self.hist
+            }
+
+
+TIMER = StageTimer()
+
+
+def merge_stats(stats, other):
+    """
+    Adds the timing stats OTHER into STATS (see StageTimer.stats).
+    """
+    for stage, (hist, total) in other.items():
+        if stage in stats:
+            hist = stats[stage][0] + hist
+            total = stats[stage][1] + total
+        stats[stage] = (hist, total)
+    return stats
+
+
+def timed(stage):
+    """
+    Decorator: times every call of the function as STAGE.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TIMER.enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                TIMER.add(stage, t0, time.perf_counter())
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def _span(stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        TIMER.add(stage, t0, time.perf_counter())
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    """
+    Context manager: times the enclosed block as STAGE.
+    """
+    if not TIMER.enabled:
+        return _NULL_SPAN
+    return _span(stage)
+
+
+def percentile(hist, q):
+    """
+    Approximate Q-th percentile (s) of the durations in HIST
+    (the upper edge of the bin it falls in).
+    """
+    cum = np.cumsum(hist)
+    i = np.searchsorted(cum, q / 100.0 * cum[-1])
+    return BINS[min(i, len(BINS) - 1)]
+
+
+def report(stats=None):
+    """
+    Returns a table of the time spent per stage.
+    """
+    if stats is None:
+        stats = TIMER.stats()
+    lines = [
+        '%-16s %8s %10s %9s %9s %9s' %
+        ('stage', 'count', 'total(s)', 'mean(ms)', 'p50(ms)', 'p95(ms)')
+    ]
+    for stage, (hist, total) in sorted(stats.items(),
+                                       key=lambda kv: -kv[1][1]):
+        n = hist.sum()
+        lines.append('%-16s %8d %10.2f %9.2f %9.2f %9.2f' %
+                     (stage, n, total, 1000 * total / max(n, 1),
+                      1000 * percentile(hist, 50),
+                      1000 * percentile(hist, 95)))
+    return '\n'.join(lines)
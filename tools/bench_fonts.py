@@ -0,0 +1,74 @@
+"""
+Throughput of TextRenderer.render_text (calls/s) with and without the
+cache of parsed fonts (CFG.TextState.font_cache_size), on a blank
+collision mask; and the time of TextState.sample_font_state alone,
+which is where the fonts are loaded.
+
+    python tools/bench_fonts.py
+    python tools/bench_fonts.py --ncall 500 --cache_sizes 0 1 64
+"""
+import sys
+import io
+import time
+import argparse
+import contextlib
+
+import numpy as np
+
+sys.path.insert(0, './')
+
+from synthtext.common import derive_rng
+from synthtext.text_renderer import TextRenderer
+
+
+def run(renderer, mask, ncall, seed):
+    """
+    Returns (calls/s, no. of texts rendered).
+    """
+    renderer.set_rng(derive_rng(seed, 'fonts'))
+    nrender = 0
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(ncall):
+            nrender += renderer.render_text(mask) is not None
+    return ncall / (time.perf_counter() - t0), nrender
+
+
+def time_font_state(text_state, ncall):
+    """
+    Microseconds per TextState.sample_font_state.
+    """
+    t0 = time.perf_counter()
+    for _ in range(ncall):
+        text_state.sample_font_state()
+    return 1e6 * (time.perf_counter() - t0) / ncall
+
+
+def main(args):
+    renderer = TextRenderer()
+    text_state = renderer.text_state
+    mask = np.zeros((args.height, args.width), 'uint8')
+    print('%-12s %10s %10s %10s %10s %12s' %
+          ('cache_size', 'calls/s', 'rendered', 'hits', 'misses',
+           'us/font'))
+    for size in args.cache_sizes:
+        text_state.font_cache_size = size
+        text_state.font_cache.clear()
+        text_state.font_cache_stats = {'hits': 0, 'misses': 0}
+        rate, nrender = run(renderer, mask, args.ncall, args.seed)
+        stats = dict(text_state.font_cache_stats)
+        us = time_font_state(text_state, 10 * args.ncall)
+        print('%-12d %10.1f %10d %10d %10d %12.1f' %
+              (size, rate, nrender, stats['hits'], stats['misses'], us))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark render_text with and without the font cache')
+    parser.add_argument('--cache_sizes', type=int, nargs='+', default=[0, 64])
+    parser.add_argument('--ncall', type=int, default=200)
+    # size of the (free) region the text is rendered for:
+    parser.add_argument('--height', type=int, default=200)
+    parser.add_argument('--width', type=int, default=400)
+    parser.add_argument('--seed', type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,112 @@
+"""
+Accuracy vs. speed of the coarse-to-fine region analysis
+(CFG.TextRegions.coarse_scale), against the analysis at full resolution.
+
+For every scale, reports the time of Renderer.get_regions per scene,
+and, w.r.t. full resolution: the fraction of the text regions found
+again (recall), the fraction of the regions found which are also
+found at full resolution (precision), and the angle between the plane
+normals of the regions found by both.
+
+    python tools/bench_regions.py --scales 1 2 4
+    python tools/bench_regions.py --scenes data/dset.h5 --nscene 20
+"""
+import sys
+import io
+import time
+import argparse
+import contextlib
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, './')
+
+from synthtext.common import derive_rng
+from synthtext.pipeline import H5SceneSource, SyntheticSceneSource
+from synthtext.renderer import Renderer
+from synthtext.renderer.text_regions import TEXT_REGIONS
+
+
+def analyze(renderer, source, imnames, scale, seed):
+    """
+    Returns ({imname: {label: plane normal}}, seconds per scene).
+    """
+    TEXT_REGIONS.coarse_scale = scale
+    planes, t = {}, 0.0
+    for imname in imnames:
+        scene = source.load(imname)
+        t0 = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            regions = renderer.get_regions(*scene[1:],
+                                           rng=derive_rng(seed, imname,
+                                                          'regions'))
+        t += time.time() - t0
+        planes[imname] = {
+            l: np.asarray(c[:3]) / np.linalg.norm(c[:3])
+            for l, c in zip(regions['label'], regions['coeff'])
+        }
+    return planes, t / len(imnames)
+
+
+def compare(ref, planes):
+    """
+    Recall, precision and normal angles (deg) of PLANES w.r.t. REF.
+    """
+    nref, nfound, nboth, angles = 0, 0, 0, []
+    for imname in ref:
+        a, b = ref[imname], planes[imname]
+        both = set(a) & set(b)
+        nref += len(a)
+        nfound += len(b)
+        nboth += len(both)
+        angles += [
+            np.degrees(np.arccos(np.clip(abs(a[l].dot(b[l])), 0, 1)))
+            for l in both
+        ]
+    return (nboth / max(nref, 1), nboth / max(nfound, 1),
+            np.array(angles) if len(angles) > 0 else np.zeros(1))
+
+
+def main(args):
+    cv2.setNumThreads(1)
+    if args.scenes is None:
+        source = SyntheticSceneSource(args.nscene, args.height, args.width,
+                                      args.seed)
+        imnames = source.names()
+    else:
+        source = H5SceneSource(args.scenes)
+        imnames = source.names()[:args.nscene]
+    renderer = Renderer()
+    scale0 = TEXT_REGIONS.coarse_scale
+
+    ref, t_ref = analyze(renderer, source, imnames, 1, args.seed)
+    print('%-6s %9s %8s %8s %9s %12s %12s' %
+          ('scale', 'ms/scene', 'speedup', 'regions', 'recall', 'precision',
+           'angle(deg)'))
+    for scale in args.scales:
+        if scale == 1:
+            planes, t = ref, t_ref
+        else:
+            planes, t = analyze(renderer, source, imnames, scale, args.seed)
+        recall, precision, angles = compare(ref, planes)
+        print('%-6d %9.1f %8.2f %8d %9.3f %12.3f %5.2f/%5.2f' %
+              (scale, 1000 * t, t_ref / t,
+               sum(len(p) for p in planes.values()), recall, precision,
+               np.mean(angles), np.max(angles)))
+    TEXT_REGIONS.coarse_scale = scale0
+    print('(angle: mean/max between the normals of the regions found at '
+          'both scales)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Accuracy vs. speed of the coarse-to-fine region analysis')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 2, 4])
+    # dset.h5-style scenes (default: procedurally generated scenes):
+    parser.add_argument('--scenes', default=None)
+    parser.add_argument('--nscene', type=int, default=8)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--seed', type=int, default=0)
+    main(parser.parse_args())
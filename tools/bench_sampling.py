@@ -0,0 +1,69 @@
+"""
+Micro-benchmark of the sampling of the RANSAC seeds
+(TextRegions.sample_grid_neighbours) on large region masks, e.g. walls
+and roads covering most of the image.
+
+    python tools/bench_sampling.py
+    python tools/bench_sampling.py --sizes 480x640 1080x1920 --fill 0.9
+"""
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, './')
+
+from synthtext.renderer.text_regions import TextRegions
+
+
+def make_mask(height, width, fill, rng):
+    """
+    A blob covering about FILL of an HEIGHTxWIDTH image.
+    """
+    yy, xx = np.mgrid[:height, :width]
+    r = np.sqrt(fill / np.pi) * np.sqrt(height * width)
+    d = np.hypot(yy - height / 2, (xx - width / 2) * 1.0)
+    # roughen the boundary a bit:
+    return d < r * (1 + 0.05 * rng.standard_normal((height, width)))
+
+
+def time_call(fn, repeat):
+    ts = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        ts.append(time.perf_counter() - t0)
+    return np.median(ts)
+
+
+def main(args):
+    regions = TextRegions()
+    rng = np.random.default_rng(args.seed)
+    print('%-12s %10s %10s %12s' % ('mask', 'pixels', 'ms/call', 'Mpix/s'))
+    for size in args.sizes:
+        height, width = [int(v) for v in size.split('x')]
+        mask = make_mask(height, width, args.fill, rng)
+        t = time_call(
+            lambda: regions.sample_grid_neighbours(
+                mask, args.nsample, step=3, rng=np.random.default_rng(0)),
+            args.repeat)
+        npix = np.count_nonzero(mask)
+        print('%-12s %10d %10.2f %12.1f' % (size, npix, 1000 * t,
+                                            npix / t / 1e6))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the sampling of the RANSAC seeds')
+    parser.add_argument('--sizes',
+                        nargs='+',
+                        default=['240x320', '480x640', '600x800',
+                                 '1080x1920'])
+    # fraction of the image covered by the mask:
+    parser.add_argument('--fill', type=float, default=0.6)
+    # no. of seeds, as TextRegions.ransac_fit_trials:
+    parser.add_argument('--nsample', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    main(parser.parse_args())
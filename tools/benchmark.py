@@ -0,0 +1,263 @@
+"""
+End-to-end throughput benchmark of the rendering pipeline.
+
+Runs a fixed, seeded set of procedurally generated scenes (see
+SyntheticSceneSource; dset.h5 is not needed) through the region analysis
+and the text placement, in a single process, and reports scenes/s,
+instances/s, accepted words/s and the latency per instance.
+The fonts, corpus and color models are read from data/ if it holds them;
+otherwise (or with --synthetic_assets) stand-ins are generated in a
+temporary directory (see write_synthetic_assets), so that data.tar.gz
+is not needed either.
+
+    python tools/benchmark.py --out bench.json
+    python tools/benchmark.py --baseline bench.json
+"""
+import sys
+import os
+import io
+import shutil
+import tempfile
+import json
+import time
+import platform
+import argparse
+import traceback
+import contextlib
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, './')
+
+from synthtext.common import derive_rng
+from synthtext.pipeline import SyntheticSceneSource
+from synthtext.pipeline import has_assets, set_data_dir, write_synthetic_assets
+from synthtext.renderer import Renderer
+from synthtext.renderer.text_regions import TEXT_REGIONS
+from synthtext.synth.ransac import report_counts
+from synthtext.timing import TIMER, report
+
+# metrics for which lower is better (the rest are throughputs):
+LOWER_IS_BETTER = ('latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms',
+                   'regions_ms_per_scene')
+
+
+def count_words(res):
+    """
+    No. of words placed in the instances RES.
+    """
+    return sum(len(' '.join(idict['txt']).split()) for idict in res)
+
+
+def render_instance(renderer, scene, regions, seed):
+    """
+    Returns the results of one instance, or None if rendering failed.
+    """
+    renderer.set_rng(derive_rng(*seed))
+    try:
+        # keep the per-instance logging of the renderer out of the report:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return renderer.render(*scene, ninstance=1, regions=regions)
+    except Exception:
+        traceback.print_exc()
+        return None
+
+
+def run_benchmark(args):
+    cv2.setNumThreads(args.cv2_threads)
+    if args.ransac_preemptive:
+        TEXT_REGIONS.ransac_preemptive = True
+    if args.region_threads is not None:
+        TEXT_REGIONS.region_threads = args.region_threads
+    renderer = Renderer()
+    text_state = renderer.text_render.text_state
+    source = SyntheticSceneSource(args.nscene, args.height, args.width,
+                                  args.seed)
+    imnames = source.names()
+
+    # warm up (font and glyph caches, lazy imports); the instances are
+    # seeded explicitly, so this does not change the measured output:
+    scene = source.load(imnames[0])
+    regions = renderer.get_regions(*scene[1:])
+    for i in range(args.warmup):
+        render_instance(renderer, scene, regions, ('warmup', i))
+    renderer.budget_exceeded.clear()
+    TEXT_REGIONS.ransac_counts.clear()
+    text_state.font_cache_stats = {'hits': 0, 'misses': 0}
+    TIMER.reset()
+
+    latency, nword, nplaced, nerror, t_regions = [], 0, 0, 0, 0.0
+    t_start = time.time()
+    for idx, imname in enumerate(imnames):
+        scene = source.load(imname)
+        t0 = time.time()
+        rng = derive_rng(args.seed, imname, 'regions')
+        regions = renderer.get_regions(*scene[1:], rng=rng)
+        t_regions += time.time() - t0
+        for i in range(args.ninstance):
+            # the same stream as instance i of the scene in gen.py:
+            seed = ((args.seed, idx, 'text'), i)
+            t0 = time.time()
+            res = render_instance(renderer, scene, regions, seed)
+            latency.append(time.time() - t0)
+            if res is None:
+                nerror += 1
+                continue
+            nword += count_words(res)
+            nplaced += len(res) > 0
+        print('scene %d/%d : %d regions' %
+              (idx, len(imnames) - 1, len(regions['place_mask'])))
+    wall = time.time() - t_start
+    TIMER.flush_trace()
+
+    ninstance = len(latency)
+    latency = 1000 * np.array(latency)
+    metrics = {
+        'scenes_per_s': len(imnames) / wall,
+        'instances_per_s': ninstance / wall,
+        'words_per_s': nword / wall,
+        'latency_p50_ms': float(np.percentile(latency, 50)),
+        'latency_p95_ms': float(np.percentile(latency, 95)),
+        'latency_p99_ms': float(np.percentile(latency, 99)),
+        'regions_ms_per_scene': 1000 * t_regions / len(imnames),
+    }
+    return {
+        'config': {
+            'nscene': args.nscene,
+            'ninstance': args.ninstance,
+            'height': args.height,
+            'width': args.width,
+            'seed': args.seed,
+            'cv2_threads': args.cv2_threads,
+            'ransac_preemptive': TEXT_REGIONS.ransac_preemptive,
+            'region_threads': TEXT_REGIONS.region_threads,
+            'synthetic_assets': args.synthetic_assets,
+        },
+        'env': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'cv2': cv2.__version__,
+            'machine': platform.machine(),
+            'ncpu': os.cpu_count(),
+        },
+        # the output: identical for identical code and seeds
+        'counts': {
+            'instances': ninstance,
+            'instances_placed': int(nplaced),
+            'words': nword,
+            'errors': nerror,
+        },
+        'budget_exceeded': dict(renderer.budget_exceeded),
+        'ransac': dict(TEXT_REGIONS.ransac_counts),
+        'font_cache': dict(text_state.font_cache_stats),
+        'wall_s': wall,
+        'metrics': metrics,
+    }
+
+
+def print_results(results):
+    m, c = results['metrics'], results['counts']
+    print('%d instances (%d with text, %d failed), %d words in %.1fs' %
+          (c['instances'], c['instances_placed'], c['errors'], c['words'],
+           results['wall_s']))
+    print('  scenes/s    : %8.3f' % m['scenes_per_s'])
+    print('  instances/s : %8.3f' % m['instances_per_s'])
+    print('  words/s     : %8.3f' % m['words_per_s'])
+    print('  latency/instance (ms) : p50 %.1f, p95 %.1f, p99 %.1f' %
+          (m['latency_p50_ms'], m['latency_p95_ms'], m['latency_p99_ms']))
+    print('  regions/scene (ms)    : %.1f' % m['regions_ms_per_scene'])
+    if len(results['budget_exceeded']) > 0:
+        print('  over the time budget  : %s' % results['budget_exceeded'])
+    if results['ransac'].get('fits', 0) > 0:
+        print('  ' + report_counts(results['ransac']))
+    nfont = sum(results['font_cache'].values())
+    if nfont > 0:
+        print('  font cache hits       : %.1f%% of %d' %
+              (100.0 * results['font_cache']['hits'] / nfont, nfont))
+    if TIMER.enabled:
+        # SYNTHTEXT_TIMING=1 : time per stage
+        print(report())
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the change of every metric w.r.t. BASELINE.
+    Returns the names of the metrics which are worse by more than
+    TOLERANCE (a fraction).
+    """
+    if results['config'] != baseline['config']:
+        print('WARNING: the baseline was run with a different config: %s' %
+              baseline['config'])
+    if results['counts'] != baseline['counts']:
+        print('NOTE: the output differs from the baseline: %s vs. %s' %
+              (results['counts'], baseline['counts']))
+    worse = []
+    print('%-18s %10s %10s %8s' % ('metric', 'baseline', 'current', 'change'))
+    for name, value in sorted(results['metrics'].items()):
+        if name not in baseline['metrics']:
+            continue
+        ref = baseline['metrics'][name]
+        change = (value - ref) / max(abs(ref), 1e-9)
+        if name in LOWER_IS_BETTER:
+            change = -change
+        flag = ''
+        if change < -tolerance:
+            flag = ' REGRESSION'
+            worse.append(name)
+        print('%-18s %10.3f %10.3f %+7.1f%%%s' %
+              (name, ref, value, 100 * change, flag))
+    return worse
+
+
+def main(args):
+    tmp_dir = None
+    if args.synthetic_assets or not has_assets(args.data_dir):
+        args.synthetic_assets = True
+        tmp_dir = tempfile.mkdtemp(prefix='synthtext-assets-')
+        write_synthetic_assets(tmp_dir)
+        set_data_dir(tmp_dir)
+        print('Using generated text assets (no data.tar.gz) in: ' + tmp_dir)
+    else:
+        set_data_dir(args.data_dir)
+    try:
+        results = run_benchmark(args)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+    print_results(results)
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('Results written to: ' + args.out)
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if len(compare(results, baseline, args.tolerance)) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the renderer')
+    parser.add_argument('--nscene', type=int, default=8)
+    parser.add_argument('--ninstance', type=int, default=10)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--seed', type=int, default=0)
+    # no. of untimed instances rendered first:
+    parser.add_argument('--warmup', type=int, default=2)
+    # as in the generation workers:
+    parser.add_argument('--cv2_threads', type=int, default=1)
+    # CFG.TextRegions.ransac_preemptive:
+    parser.add_argument('--ransac_preemptive', action='store_true')
+    # CFG.TextRegions.region_threads:
+    parser.add_argument('--region_threads', type=int, default=None)
+    # fonts, corpus and color models (those of data.tar.gz):
+    parser.add_argument('--data_dir', default='data')
+    # generate stand-ins for them, even if DATA_DIR has them:
+    parser.add_argument('--synthetic_assets', action='store_true')
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--baseline', default=None)
+    # allowed slow-down w.r.t. the baseline (fraction) before failing:
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    main(parser.parse_args())
@@ -0,0 +1,24 @@
+"""
+Convert the image/depth/segmentation h5 database (dset.h5) into a
+pre-processed, memory-mappable scene store, for use with:
+    tools/gen.py --scenes STORE_DIR
+"""
+import sys
+import os.path as osp
+import argparse
+
+sys.path.insert(0, './')
+
+from synthtext.pipeline import H5SceneSource, write_scene_store
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert dset.h5')
+    parser.add_argument('store_dir')
+    parser.add_argument('--db', default=osp.join('data', 'dset.h5'))
+    args = parser.parse_args()
+
+    source = H5SceneSource(args.db)
+    imnames = source.names()
+    print('Converting %d scenes to: %s' % (len(imnames), args.store_dir))
+    write_scene_store(source, args.store_dir, imnames)
+    source.close()
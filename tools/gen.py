@@ -11,9 +11,12 @@ import wget
 
 sys.path.insert(0, './')
 
-from synthtext.renderer import Renderer
-from synthtext.common import set_random_seed
-from synthtext.renderer.utils import get_bounding_rect, get_crops, filter_valid
+from synthtext.pipeline import GenerationDriver, H5SceneSource, Manifest
+from synthtext.pipeline import MemmapSceneSource
+from synthtext.pipeline import DirSink, TarShardSink, H5ShardSink
+from synthtext.pipeline import get_encoder
+from synthtext.renderer import RegionCache
+from synthtext.bbox import get_bounding_rect, get_crops, filter_valid
 
 
 def get_data(db_fp):
@@ -37,17 +40,11 @@ def get_data(db_fp):
     return h5py.File(db_fp, 'r')
 
 
-def render(engine, img, depth, seg, area, label, ninstance, viz=False):
-    # re-size uniformly:
-    sz = depth.shape[:2][::-1]
-    img = np.array(img.resize(sz, Image.ANTIALIAS))
-    seg = np.array(Image.fromarray(seg).resize(sz, Image.NEAREST))
-
-    res = engine.render(img, depth, seg, area, label, ninstance, viz)
-    return res
-
-
 def get_all_crops(idict):
+    """
+    The word crops of the instance IDICT (copies: they do not keep the
+    full image alive) and their words.
+    """
     img = idict['img']
     min_area_rect = idict['wordBB']
     words = [] 
@@ -56,96 +53,182 @@ def get_all_crops(idict):
         words.extend(segs)
     four_points, extreme_points = get_bounding_rect(min_area_rect)
     crops, valid_flags = get_crops(img, extreme_points)
-    valid_crops = filter_valid(crops, valid_flags)
+    valid_crops = [c.copy() for c in filter_valid(crops, valid_flags)]
     valid_words = filter_valid(words, valid_flags)
     return valid_crops, valid_words
 
 
-def save_crops(imgname, res, save_dir):
-    ninstance = len(res)
+def get_instance_crops(imname, idict):
+    """
+    Runs in the worker on every rendered instance: reduces it to its
+    word crops, so that full images are neither held until the scene is
+    done nor shipped between processes.
+    """
+    return get_all_crops(idict)
+
+
+def get_instance_images(imname, idict):
+    """
+    Runs in the worker on every rendered instance: ships it in full.
+    """
+    return idict
+
+
+def save_crops(imname, crops, sink):
+    """
+    Write the word crops of all the instances of IMNAME to SINK.
+    """
+    ninstance = len(crops)
     for ii in range(ninstance):
-        crops, words = get_all_crops(res[ii])
-        ncrops = len(crops)
+        crops_ii, words = crops[ii]
+        ncrops = len(crops_ii)
         for jj in range(ncrops):
-            fp = '%s/%s_ins%d_crop%d_%s.png' % (save_dir, \
-                    imgname.replace('.jpg', ''), ii, jj, words[jj])
-            print(fp)
-            #break
-            im = Image.fromarray(crops[jj])
-            im.save(fp)
-
+            key = '%s_ins%d_crop%d' % (imname, ii, jj)
+            sink.write(key, {'img': crops_ii[jj], 'txt': words[jj]})
 
 
-def add_res_to_db(imgname, res, db):
+def add_res_to_db(imname, res, sink):
     """
     Add the synthetically generated text image instance
     and other metadata to the dataset.
     """
     ninstance = len(res)
     for i in range(ninstance):
-        dname = "%s_%d" % (imgname, i)
-        db['data'].create_dataset(dname, data=res[i]['img'])
-        db['data'][dname].attrs['charBB'] = res[i]['charBB']
-        db['data'][dname].attrs['wordBB'] = res[i]['wordBB']
-        db['data'][dname].attrs['txt'] = res[i]['txt']
-
-
-def main():
-    ## Define some configuration variables:
-    viz = False
-    nimg = -1  # no. of images to use for generation (-1 to use all available):
-    ninstance = 600  # no. of times to use the same image
-    secs_per_img = 5  #max time per image in seconds
-
+        key = "%s_%d" % (imname, i)
+        sink.write(
+            key, {
+                'img': res[i]['img'],
+                'txt': res[i]['txt'],
+                'charBB': res[i]['charBB'],
+                'wordBB': res[i]['wordBB'],
+            })
+
+
+def open_sink(args, out_dir, first_shard=0):
+    encoder = None
+    if args.encoder is not None:
+        encoder = get_encoder(args.encoder,
+                              compress_level=args.compress_level,
+                              quality=args.quality)
+    if args.sink == 'png':
+        return DirSink(out_dir, encoder=encoder)
+    kwargs = dict(prefix=args.prefix,
+                  shard_size=args.shard_size,
+                  batch_size=args.batch_size,
+                  first_shard=first_shard,
+                  encoder=encoder,
+                  nthread=args.nthread)
+    if args.sink == 'tar':
+        return TarShardSink(out_dir, **kwargs)
+    return H5ShardSink(out_dir, **kwargs)
+
+
+def main(args):
     # path to the data-file, containing image, depth and segmentation:
     data_dir = 'data'
-    save_dir = '%s/output' % data_dir
+    save_dir = '%s/output' % data_dir if args.out_dir is None else args.out_dir
     in_fp = osp.join(data_dir, 'dset.h5')
-    # url of the data (google-drive public file):
-    out_fp = 'results/SynthText.h5'
 
     ## Processing
     # open databases:
     print('Getting data..')
-    in_db = get_data(in_fp)
+    if args.scenes is not None:
+        # pre-processed scene store (see convert_scenes.py):
+        source = MemmapSceneSource(args.scenes)
+    else:
+        get_data(in_fp).close()
+        source = H5SceneSource(in_fp)
     print('\t-> Done')
 
-    # open the output h5 file:
-    #out_db = h5py.File(out_fp, 'w')
-    #out_db.create_group('/data')
-    #print('Storing the output in: ' + out_fp)
+    # open the output sink and the record of completed scenes:
+    if args.images and args.sink == 'png':
+        raise ValueError('full images need a tar or h5 sink')
+    if not osp.exists(save_dir):
+        os.makedirs(save_dir)
+    header = {
+        'seed': args.seed,
+        'ninstance': args.ninstance,
+        'images': args.images,
+        'sink': args.sink,
+        'prefix': args.prefix,
+        'encoder': args.encoder,
+    }
+    manifest = Manifest(osp.join(save_dir, '%s-manifest.jsonl' % args.prefix),
+                        header,
+                        resume=args.resume)
+    sink = open_sink(args, save_dir, first_shard=manifest.last_shard + 1)
+    print('Storing the output in: ' + save_dir)
+    if len(manifest.completed) > 0:
+        print('Resuming: %d scenes already done' % len(manifest.completed))
 
     # get the names of the image files in the dataset:
-    imnames = sorted(in_db['image'].keys())
-    nimg = len(imnames) if nimg < 0 else min(len(imnames), nimg)
-
-    engine = Renderer()
-    for i in range(nimg):
-        imname = imnames[i]
-        # get the image:
-        img = Image.fromarray(in_db['image'][imname][:])
-        # get the pre-computed depth:
-        #  there are 2 estimates of depth (represented as 2 "channels")
-        #  here we are using the second one (in some cases it might be
-        #  useful to use the other one):
-        depth = in_db['depth'][imname][:].T
-        depth = depth[:, :, 1]
-        # get segmentation:
-        seg = in_db['seg'][imname][:].astype('float32')
-        area = in_db['seg'][imname].attrs['area']
-        label = in_db['seg'][imname].attrs['label']
-
-        print('Imge %d/%d' % (i, nimg - 1))
-        res = render(engine, img, depth, seg, area, label, ninstance, viz)
-
-        if len(res) > 0:
-            save_crops(imname, res, save_dir)
-            # non-empty : successful in placing text:
-            #add_res_to_db(imname, res, out_db)
-    in_db.close()
-    #out_db.close()
+    imnames = source.names()
+    nimg = len(imnames) if args.nimg < 0 else min(len(imnames), args.nimg)
+
+    # scenes written to the sink, but not yet safely on disk:
+    pending = []
+
+    def write(idx, imname, out):
+        # non-empty : successful in placing text:
+        if len(out) > 0:
+            if args.images:
+                add_res_to_db(imname, out, sink)
+            else:
+                save_crops(imname, out, sink)
+        pending.append((idx, imname, len(out)))
+        if sink.commit():
+            manifest.add(pending, getattr(sink, 'shard_idx', None))
+            del pending[:]
+
+    process_fn = get_instance_images if args.images else get_instance_crops
+    cache = None
+    if args.cache_dir is not None:
+        cache = RegionCache(args.cache_dir, args.seed)
+    driver = GenerationDriver(source,
+                              process_fn,
+                              nworker=args.nworker,
+                              ninstance=args.ninstance,
+                              seed=args.seed,
+                              prefetch=args.prefetch,
+                              cache=cache)
+    driver.run(imnames[:nimg], write, skip=manifest.completed)
+    source.close()
+    sink.close()
+    manifest.add(pending, getattr(sink, 'shard_idx', None))
+    manifest.close()
+    if hasattr(sink, 'pool'):
+        print('Encoding: ' + sink.pool.report())
 
 
 if __name__ == '__main__':
-    set_random_seed()
-    main()
+    parser = argparse.ArgumentParser(description='Generate synthetic text')
+    # no. of images to use for generation (-1 to use all available):
+    parser.add_argument('--nimg', type=int, default=-1)
+    # no. of times to use the same image:
+    parser.add_argument('--ninstance', type=int, default=600)
+    # no. of worker processes, each with its own Renderer:
+    parser.add_argument('--nworker', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    # scene store to read instead of data/dset.h5:
+    parser.add_argument('--scenes', default=None)
+    # cache of the text regions of the scenes (see precompute_regions.py):
+    parser.add_argument('--cache_dir', default=None)
+    # no. of scenes to load ahead in the background (single process):
+    parser.add_argument('--prefetch', type=int, default=2)
+    # output: word crops (default) or full images with their annotations:
+    parser.add_argument('--images', action='store_true')
+    parser.add_argument('--sink', choices=['png', 'tar', 'h5'], default='tar')
+    parser.add_argument('--out_dir', default=None)
+    parser.add_argument('--prefix', default='shard')
+    # no. of samples per output shard / per batched write:
+    parser.add_argument('--shard_size', type=int, default=10000)
+    parser.add_argument('--batch_size', type=int, default=256)
+    # image encoding (default: png for tar, raw arrays for h5):
+    parser.add_argument('--encoder', choices=['png', 'jpg', 'raw'], default=None)
+    parser.add_argument('--compress_level', type=int, default=6)
+    parser.add_argument('--quality', type=int, default=90)
+    # no. of encoding threads (0 to encode in the writing thread):
+    parser.add_argument('--nthread', type=int, default=4)
+    # skip the scenes recorded in the manifest of a previous run:
+    parser.add_argument('--resume', action='store_true')
+    main(parser.parse_args())
@@ -0,0 +1,56 @@
+"""
+Pre-compute the text regions (plane fits, placement masks and
+homographies) of all the scenes in dset.h5 into a RegionCache,
+for use with: tools/gen.py --cache_dir CACHE_DIR
+"""
+import sys
+import os.path as osp
+import argparse
+
+sys.path.insert(0, './')
+
+from synthtext.pipeline import GenerationDriver, H5SceneSource
+from synthtext.renderer import RegionCache
+
+
+def no_output(imname, idict):
+    """
+    Not called: no instance is rendered (NINSTANCE=0).
+    """
+    return None
+
+
+def main(args):
+    source = H5SceneSource(osp.join('data', 'dset.h5'))
+    cache = RegionCache(args.cache_dir, args.seed)
+    print('Caching the regions in: ' + cache.cache_dir)
+
+    imnames = source.names()
+    nimg = len(imnames) if args.nimg < 0 else min(len(imnames), args.nimg)
+    imnames = imnames[:nimg]
+    # scenes already in the cache:
+    done = [n for n in imnames if cache.nregions(n) is not None]
+
+    # no text is placed: the driver only runs (and caches)
+    # the region analysis of every scene:
+    driver = GenerationDriver(source,
+                              no_output,
+                              nworker=args.nworker,
+                              ninstance=0,
+                              seed=args.seed,
+                              cache=cache)
+    driver.run(imnames, lambda idx, imname, out: None, skip=done)
+    source.close()
+
+    nempty = len([n for n in imnames if cache.nregions(n) == 0])
+    print('%d scenes, %d without any text region' % (nimg, nempty))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-compute text regions')
+    parser.add_argument('cache_dir')
+    parser.add_argument('--nimg', type=int, default=-1)
+    parser.add_argument('--nworker', type=int, default=1)
+    # the RANSAC plane fits are random: use the seed of the generation runs
+    parser.add_argument('--seed', type=int, default=0)
+    main(parser.parse_args())
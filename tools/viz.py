@@ -4,11 +4,15 @@ data stored in h5 data-bases
 """
 import os
 import os.path as osp
+import sys
 import matplotlib
 #matplotlib.use('Agg')
 import numpy as np
 import matplotlib.pyplot as plt
-import h5py
+
+sys.path.insert(0, './')
+
+from synthtext.pipeline import read_h5_shard
 
 
 def viz_textbb(text_im, charBB_list, wordBB, alpha=1.0):
@@ -49,14 +53,12 @@ def viz_textbb(text_im, charBB_list, wordBB, alpha=1.0):
     #plt.savefig('xx.png')
 
 
-def viz_all(db):
-    dsets = sorted(db['data'].keys())
-    print('Total number of images : ', len(dsets))
-    for k in dsets:
-        rgb = db['data'][k][...]
-        charBB = db['data'][k].attrs['charBB']
-        wordBB = db['data'][k].attrs['wordBB']
-        txt = db['data'][k].attrs['txt']
+def viz_all(shard_fp):
+    for k, sample in read_h5_shard(shard_fp):
+        rgb = sample['img']
+        charBB = sample['charBB']
+        wordBB = sample['wordBB']
+        txt = sample['txt'].split('\n')
 
         viz_textbb(rgb, [charBB], wordBB)
         print('Image name        : ', k)
@@ -69,7 +71,6 @@ def viz_all(db):
 
 
 if __name__ == '__main__':
-    db_fname = 'results/SynthText.h5'
-    db = h5py.File(db_fname, 'r')
-    visualize(db)
-    db.close()
+    # a shard written by: tools/gen.py --images --sink h5
+    shard_fp = sys.argv[1]
+    viz_all(shard_fp)